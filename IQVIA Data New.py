@@ -1,24 +1,17 @@
 import os
 import sys
-import csv
-import zipfile
+import queue
+import shutil
 import tempfile
-import time
+import threading
+import multiprocessing as mp
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from tkinter.ttk import Progressbar
 from threading import Thread
 
-# Optional/extra deps (only used in specific tabs)
-try:
-    import pandas as pd  # For Validate tab (Excel matching)
-except Exception:
-    pd = None
-
-try:
-    from openpyxl import Workbook  # For Verify Sums tab (Excel export)
-except Exception:
-    Workbook = None
+# All processing lives in the UI-free engine (also used by iqvia_cli.py)
+import iqvia_core as core
 
 APP_TITLE = "All-in-One CSV • ZIP • (CSV Validation)"
 APP_SIZE = "1000x720"
@@ -33,6 +26,14 @@ ERROR = "#c62828"
 
 # ------------------------------ Shared UI helpers ------------------------------
 class LogConsole(tk.Frame):
+    """Log view that is safe to call from worker threads.
+    `log()` only queues the line and appends it to a temp-file sink; the Tk main loop drains
+    the queue every FLUSH_MS in batches of at most MAX_LINES_PER_TICK lines, and the widget
+    keeps only the last MAX_LINES lines. The sink holds the full log for `export`."""
+    FLUSH_MS = 100
+    MAX_LINES_PER_TICK = 500
+    MAX_LINES = 5000
+
     def __init__(self, master, *args, **kwargs):
         super().__init__(master, bg=CARD_BG, *args, **kwargs)
         lbl = tk.Label(self, text="Processing Log", font=("Segoe UI", 10, "bold"), bg=CARD_BG, fg=TXT)
@@ -43,10 +44,82 @@ class LogConsole(tk.Frame):
         self.text.configure(yscrollcommand=y.set)
         y.place(relx=1, rely=0, relheight=1, anchor='ne')
 
+        self._pending = queue.Queue()
+        self._sink = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self._sink_lock = threading.Lock()
+        self._lines = 0
+        self._after_id = self.after(self.FLUSH_MS, self._drain)
+
     def log(self, msg):
-        self.text.insert(tk.END, msg + "\n")
-        self.text.see(tk.END)
-        self.update_idletasks()
+        with self._sink_lock:
+            self._sink.write(msg + "\n")
+        self._pending.put(msg)
+
+    def _drain(self):
+        batch = []
+        try:
+            while len(batch) < self.MAX_LINES_PER_TICK:
+                batch.append(self._pending.get_nowait())
+        except queue.Empty:
+            pass
+        if batch:
+            chunk = "\n".join(batch) + "\n"
+            self.text.insert(tk.END, chunk)
+            self._lines += chunk.count("\n")
+            if self._lines > self.MAX_LINES:
+                drop = self._lines - self.MAX_LINES
+                self.text.delete("1.0", f"{drop + 1}.0")
+                self._lines = self.MAX_LINES
+            self.text.see(tk.END)
+        # Come straight back while a backlog remains
+        self._after_id = self.after(1 if len(batch) == self.MAX_LINES_PER_TICK else self.FLUSH_MS, self._drain)
+
+    def is_empty(self):
+        with self._sink_lock:
+            return self._sink.tell() == 0
+
+    def export(self, path):
+        """Copy the full log (not just the lines still shown) to `path`."""
+        with self._sink_lock:
+            self._sink.flush()
+            self._sink.seek(0)
+            with open(path, 'w', encoding='utf-8') as out:
+                shutil.copyfileobj(self._sink, out)
+            self._sink.seek(0, os.SEEK_END)
+
+    def destroy(self):
+        self.after_cancel(self._after_id)   # a drain after this would hit the destroyed Text
+        self._sink.close()
+        super().destroy()
+
+
+class MainLoopCalls(tk.Frame):
+    """Runs calls posted from worker threads on the Tk main loop. `post()` only queues the
+    call; the main loop drains the queue every POLL_MS, in order, so a run's last progress
+    update is shown before its finish. Create it as a (never shown) child of the tab: it
+    stops polling when the tab is destroyed."""
+    POLL_MS = 100
+
+    def __init__(self, master):
+        super().__init__(master)
+        self._calls = queue.Queue()
+        self._after_id = self.after(self.POLL_MS, self._drain)
+
+    def post(self, fn, *args):
+        self._calls.put((fn, args))
+
+    def _drain(self):
+        try:
+            while True:
+                fn, args = self._calls.get_nowait()
+                fn(*args)
+        except queue.Empty:
+            pass
+        self._after_id = self.after(self.POLL_MS, self._drain)
+
+    def destroy(self):
+        self.after_cancel(self._after_id)
+        super().destroy()
 
 # ------------------------------ Tab 1: Clean Data (ZIP -> individual cleaned CSVs) ------------------------------
 class CleanCombineTab(tk.Frame):
@@ -55,7 +128,22 @@ class CleanCombineTab(tk.Frame):
         self.files = []
         self.output_dir = ""
         self.processing = False
-        self.cancel = False
+        self.cancel = threading.Event()
+        self.stream_zip = tk.BooleanVar(value=True)
+        self._stream_zip = True
+        self.workers = tk.IntVar(value=core.default_workers())
+        self._workers = 1
+        self.with_totals = tk.BooleanVar(value=False)
+        self._with_totals = False
+        self.force = tk.BooleanVar(value=False)
+        self._force = False
+        self.checkpoints = tk.BooleanVar(value=False)
+        self._checkpoints = False
+        self.out_format = tk.StringVar(value="csv")
+        self._fmt = "csv"
+        self.write_report = tk.BooleanVar(value=False)
+        self._report = False
+        self.calls = MainLoopCalls(self)
 
         self._build_ui()
 
@@ -107,69 +195,26 @@ class CleanCombineTab(tk.Frame):
         self.cancel_btn = ttk.Button(ctl, text="Cancel", command=self.request_cancel, state=tk.DISABLED)
         self.cancel_btn.pack(side=tk.LEFT, padx=8)
         ttk.Button(ctl, text="Export Log", command=self.export_log).pack(side=tk.LEFT, padx=8)
+        tk.Checkbutton(ctl, text="Stream CSVs from ZIP (no temp extraction)", variable=self.stream_zip,
+                       bg=CARD_BG, activebackground=CARD_BG).pack(side=tk.LEFT, padx=8)
+        tk.Label(ctl, text="Workers", bg=CARD_BG, fg=TXT).pack(side=tk.LEFT, padx=(8, 4))
+        tk.Spinbox(ctl, from_=1, to=max(64, core.default_workers()), width=4, textvariable=self.workers).pack(side=tk.LEFT)
+        tk.Checkbutton(ctl, text="Write column totals (Verify) while cleaning", variable=self.with_totals,
+                       bg=CARD_BG, activebackground=CARD_BG).pack(side=tk.LEFT, padx=8)
+        tk.Checkbutton(ctl, text="Re-process unchanged ZIPs", variable=self.force,
+                       bg=CARD_BG, activebackground=CARD_BG).pack(side=tk.LEFT, padx=8)
+        tk.Checkbutton(ctl, text="Resume cancelled files", variable=self.checkpoints,
+                       bg=CARD_BG, activebackground=CARD_BG).pack(side=tk.LEFT, padx=8)
+        tk.Label(ctl, text="Output format", bg=CARD_BG, fg=TXT).pack(side=tk.LEFT, padx=(8, 4))
+        ttk.Combobox(ctl, textvariable=self.out_format, values=list(core.OUTPUT_FORMATS), state="readonly",
+                     width=8).pack(side=tk.LEFT)
+        tk.Checkbutton(ctl, text="Write run report", variable=self.write_report,
+                       bg=CARD_BG, activebackground=CARD_BG).pack(side=tk.LEFT, padx=8)
 
         # Console
         self.console = LogConsole(self)
         self.console.pack(fill=tk.BOTH, expand=True, padx=12, pady=8)
 
-    # ----------- Core cleaning logic (from code-1), WITHOUT combining -----------
-    def _clean_one_csv(self, csv_path, suffix_label, output_folder, zip_base):
-        """Clean a single CSV file and write to output with _processed suffix.
-        Adds `suffix_label` as an extra column value on each row.
-        Output filename is based on the ZIP file name, not the CSV file name."""
-        output_lines = []
-
-        with open(csv_path, "r", encoding="utf-8-sig", newline="") as file:
-            sample = file.read(4096)
-            file.seek(0)
-            sniffer = csv.Sniffer()
-            delimiter = ","
-            try:
-                delimiter = sniffer.sniff(sample).delimiter
-            except csv.Error:
-                pass
-
-            reader = list(csv.reader(file, delimiter=delimiter))
-            if len(reader) > 2:
-                reader = reader[1:-1]
-
-            for cols in reader:
-                cols = [c.replace('"', '').strip() for c in cols]
-                if len(cols) < 3:
-                    continue
-                if cols[1].strip().lower() == cols[2].strip().lower():
-                    continue
-                cols.append(suffix_label)
-                output_lines.append(cols)
-
-        os.makedirs(output_folder, exist_ok=True)
-        out_path = os.path.join(output_folder, f"{zip_base}_processed.csv")
-        with open(out_path, "w", encoding="utf-8", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerows(output_lines)
-
-        return out_path
-
-    def process_zip_file(self, zip_path, output_folder):
-        """Process each CSV inside the ZIP individually (no combining).
-        Output filename uses the ZIP name."""
-        created = []
-        zip_base = os.path.splitext(os.path.basename(zip_path))[0]
-
-        with zipfile.ZipFile(zip_path, 'r') as z:
-            with tempfile.TemporaryDirectory() as tmp:
-                z.extractall(tmp)
-                for root, _, files in os.walk(tmp):
-                    for file in files:
-                        if file.lower().endswith('.csv'):
-                            src_csv = os.path.join(root, file)
-                            try:
-                                outp = self._clean_one_csv(src_csv, zip_base, output_folder, zip_base)
-                                created.append(outp)
-                            except Exception as e:
-                                self.console.log(f"ERROR cleaning {file}: {e}")
-        return created
-
     def browse_files(self):
         paths = filedialog.askopenfilenames(title="Select ZIP Files", filetypes=[("ZIP files", "*.zip")])
         if paths:
@@ -196,7 +241,17 @@ class CleanCombineTab(tk.Frame):
             messagebox.showwarning("Missing", "Please select an output folder")
             return
         self.processing = True
-        self.cancel = False
+        self.cancel.clear()
+        self._stream_zip = self.stream_zip.get()
+        self._with_totals = self.with_totals.get()
+        self._force = self.force.get()
+        self._checkpoints = self.checkpoints.get()
+        self._fmt = self.out_format.get()
+        self._report = self.write_report.get()
+        try:
+            self._workers = max(1, int(self.workers.get()))
+        except (tk.TclError, ValueError):
+            self._workers = core.default_workers()
         self.run_btn.config(state=tk.DISABLED)
         self.cancel_btn.config(state=tk.NORMAL)
         self.progress['value'] = 0
@@ -204,42 +259,45 @@ class CleanCombineTab(tk.Frame):
         Thread(target=self._run, daemon=True).start()
 
     def request_cancel(self):
-        self.cancel = True
+        self.cancel.set()
         self.status.config(text="Cancelling...", fg=WARN)
 
+    def _show_progress(self, done, total, text):
+        # called on the worker thread; Tk widgets may only be touched from the main loop
+        self.calls.post(self._set_progress, (done / total) * 100, text)
+
+    def _set_progress(self, value, text):
+        self.progress['value'] = value
+        self.status.config(text=text, fg=WARN)
+
     def _run(self):
-        t0 = time.time()
-        outputs = []
-        total = len(self.files)
-        for i, path in enumerate(self.files, 1):
-            if self.cancel:
-                break
-            try:
-                self.console.log(f"Cleaning ZIP: {os.path.basename(path)}")
-                created = self.process_zip_file(path, self.output_dir)
-                outputs.extend(created)
-                for outp in created:
-                    self.console.log(f"  → Saved: {os.path.basename(outp)}")
-            except Exception as e:
-                self.console.log(f"ERROR processing {os.path.basename(path)}: {e}")
-            self.progress['value'] = (i / total) * 100
-            self.status.config(text=f"{i}/{total} ZIP(s) done", fg=SUCCESS)
-        dt = time.time() - t0
-        self.status.config(text="Complete" if not self.cancel else "Cancelled", fg=SUCCESS if not self.cancel else ERROR)
+        try:
+            summary = core.run_clean(self.files, self.output_dir, self._workers, self._stream_zip,
+                                     log=self.console.log, progress=self._show_progress, cancel=self.cancel,
+                                     totals=self._with_totals, force=self._force, checkpoints=self._checkpoints,
+                                     fmt=self._fmt, stats=core.RunStats() if self._report else None)
+        except Exception as e:
+            self.console.log(f"ERROR: {e}")
+            summary = None
+        self.calls.post(self._finish, summary)   # after any progress update still queued
+
+    def _finish(self, summary):
+        state = "Failed" if summary is None else "Cancelled" if summary["cancelled"] else "Complete"
+        self.processing = False
+        self.status.config(text=state, fg=SUCCESS if state == "Complete" else ERROR)
         self.run_btn.config(state=tk.NORMAL)
         self.cancel_btn.config(state=tk.DISABLED)
-        if not self.cancel:
-            msg = f"Processed {len(outputs)} cleaned CSV file(s) in {dt:.2f}s.\nSaved in: {self.output_dir}"
+        if state == "Complete":
+            msg = f"Processed {len(summary['outputs'])} cleaned CSV file(s) in {summary['seconds']:.2f}s.\nSaved in: {self.output_dir}"
             messagebox.showinfo("Done", msg)
 
     def export_log(self):
-        if not self.console.text.get("1.0", tk.END).strip():
+        if self.console.is_empty():
             messagebox.showinfo("Log", "Log is empty")
             return
         f = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text", "*.txt")], title="Save Log")
         if f:
-            with open(f, 'w', encoding='utf-8') as out:
-                out.write(self.console.text.get("1.0", tk.END))
+            self.console.export(f)
             messagebox.showinfo("Saved", f"Log saved to:\n{f}")
 
 # ------------------------------ Tab 2: Verify Data (sum columns 4,5,6) ------------------------------
@@ -249,12 +307,22 @@ class VerifySumsTab(tk.Frame):
         self.files = []
         self.output_dir = ""
         self.processing = False
+        self.cancel = threading.Event()
+        self.force = tk.BooleanVar(value=False)
+        self._force = False
+        self.write_report = tk.BooleanVar(value=False)
+        self._report = False
+        self.summary_format = tk.StringVar(value="xlsx")
+        self._summary_format = "xlsx"
+        self.workers = tk.IntVar(value=core.default_workers())
+        self._workers = 1
+        self.calls = MainLoopCalls(self)
         self._build_ui()
 
     def _build_ui(self):
         header = tk.Frame(self, bg=ACCENT)
         header.pack(fill=tk.X)
-        tk.Label(header, text="Verify Data (Sum Columns 4, 5, 6) — Browse CSV only", fg="white", bg=ACCENT,
+        tk.Label(header, text="Verify Data (Sum Columns 4, 5, 6) — CSV or ZIP", fg="white", bg=ACCENT,
                  font=("Segoe UI", 14, "bold")).pack(side=tk.LEFT, padx=16, pady=12)
 
         top = tk.Frame(self, bg=BG)
@@ -282,13 +350,27 @@ class VerifySumsTab(tk.Frame):
         self.status.pack(side=tk.LEFT)
         self.run_btn = ttk.Button(action, text="Start", command=self.start)
         self.run_btn.pack(side=tk.LEFT, padx=10)
+        self.cancel_btn = ttk.Button(action, text="Cancel", command=self.request_cancel, state=tk.DISABLED)
+        self.cancel_btn.pack(side=tk.LEFT, padx=8)
+        tk.Checkbutton(action, text="Re-check unchanged files", variable=self.force,
+                       bg=CARD_BG, activebackground=CARD_BG).pack(side=tk.LEFT, padx=8)
+        tk.Checkbutton(action, text="Write run report", variable=self.write_report,
+                       bg=CARD_BG, activebackground=CARD_BG).pack(side=tk.LEFT, padx=8)
+        tk.Label(action, text="Workers", bg=CARD_BG, fg=TXT).pack(side=tk.LEFT, padx=(8, 4))
+        tk.Spinbox(action, from_=1, to=max(64, core.default_workers()), width=4,
+                   textvariable=self.workers).pack(side=tk.LEFT)
+        tk.Label(action, text="Summary format", bg=CARD_BG, fg=TXT).pack(side=tk.LEFT, padx=(8, 4))
+        ttk.Combobox(action, textvariable=self.summary_format, values=list(core.SUMMARY_FORMATS), state="readonly",
+                     width=6).pack(side=tk.LEFT)
 
         # Console
         self.console = LogConsole(self)
         self.console.pack(fill=tk.BOTH, expand=True, padx=12, pady=8)
 
     def browse_files(self):
-        paths = filedialog.askopenfilenames(title="Select CSV Files", filetypes=[("CSV files", "*.csv")])
+        paths = filedialog.askopenfilenames(title="Select CSV Files",
+                                            filetypes=[("CSV files", "*.csv"), ("Compressed CSV files", "*.csv.gz *.csv.zst"),
+                                                       ("ZIP files", "*.zip"), ("Parquet files", "*.parquet")])
         if paths:
             self.files = list(paths)
             shown = ", ".join(os.path.basename(x) for x in self.files[:3])
@@ -303,30 +385,6 @@ class VerifySumsTab(tk.Frame):
             self.out_lbl.config(text=folder)
             self.console.log(f"Output folder: {folder}")
 
-    def sum_4_5_6(self, csv_path):
-        total4 = total5 = total6 = 0.0
-        rows = 0
-        with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
-            reader = csv.reader(f)
-            for row in reader:
-                rows += 1
-                try:
-                    if len(row) > 3:
-                        total4 += float(row[3])
-                except ValueError:
-                    pass
-                try:
-                    if len(row) > 4:
-                        total5 += float(row[4])
-                except ValueError:
-                    pass
-                try:
-                    if len(row) > 5:
-                        total6 += float(row[5])
-                except ValueError:
-                    pass
-        return rows, round(total4, 2), round(total5, 2), round(total6, 2)
-
     def start(self):
         if self.processing:
             return
@@ -336,39 +394,54 @@ class VerifySumsTab(tk.Frame):
         if not self.output_dir:
             messagebox.showwarning("Missing", "Please select an output folder")
             return
-        if Workbook is None:
+        if self.summary_format.get() == "xlsx" and not core.installed("openpyxl"):
             messagebox.showerror("Dependency missing", "openpyxl is required for Excel export. Install with: pip install openpyxl")
             return
         self.processing = True
+        self.cancel.clear()
+        self._force = self.force.get()
+        self._report = self.write_report.get()
+        self._summary_format = self.summary_format.get()
+        try:
+            self._workers = max(1, int(self.workers.get()))
+        except (tk.TclError, ValueError):
+            self._workers = core.default_workers()
         self.run_btn.config(state=tk.DISABLED)
+        self.cancel_btn.config(state=tk.NORMAL)
         self.progress['value'] = 0
         Thread(target=self._run, daemon=True).start()
 
+    def request_cancel(self):
+        self.cancel.set()
+        self.status.config(text="Cancelling...", fg=WARN)
+
+    def _show_progress(self, done, total, text):
+        self.calls.post(self._set_progress, (done / total) * 100, text)
+
+    def _set_progress(self, value, text):
+        self.progress['value'] = value
+        self.status.config(text=text)
+
     def _run(self):
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Summary"
-        ws.append(["File Name", "Total Rows", "Sum Col 4", "Sum Col 5", "Sum Col 6"])
-        total = len(self.files)
-        for i, path in enumerate(self.files, 1):
-            try:
-                rows, c4, c5, c6 = self.sum_4_5_6(path)
-                ws.append([os.path.basename(path), rows, c4, c5, c6])
-                self.console.log(f"{os.path.basename(path)} → rows={rows}, c4={c4}, c5={c5}, c6={c6}")
-            except Exception as e:
-                self.console.log(f"ERROR: {os.path.basename(path)} → {e}")
-            self.progress['value'] = (i/total) * 100
-            self.status.config(text=f"{i}/{total} done")
-        # Auto-fit columns (simple heuristic)
-        for column_cells in ws.columns:
-            max_len = max(len(str(cell.value)) if cell.value is not None else 0 for cell in column_cells)
-            ws.column_dimensions[column_cells[0].column_letter].width = max(12, min(60, int(max_len * 1.2)))
-        out_path = os.path.join(self.output_dir, "Column Totals Summary.xlsx")
-        wb.save(out_path)
-        self.status.config(text="Complete", fg=SUCCESS)
+        try:
+            summary = core.run_verify(self.files, self.output_dir, log=self.console.log, progress=self._show_progress,
+                                      cancel=self.cancel, force=self._force,
+                                      stats=core.RunStats() if self._report else None,
+                                      summary_format=self._summary_format, workers=self._workers)
+            out_path = summary["outputs"][0]
+        except Exception as e:
+            self.console.log(f"ERROR: {e}")
+            summary = out_path = None
+        self.calls.post(self._finish, summary, out_path)
+
+    def _finish(self, summary, out_path):
+        state = "Failed" if summary is None else "Cancelled" if summary["cancelled"] else "Complete"
+        self.status.config(text=state, fg=SUCCESS if state == "Complete" else ERROR)
         self.processing = False
         self.run_btn.config(state=tk.NORMAL)
-        messagebox.showinfo("Done", f"Saved summary to:\n{out_path}")
+        self.cancel_btn.config(state=tk.DISABLED)
+        if state == "Complete":
+            messagebox.showinfo("Done", f"Saved summary to:\n{out_path}")
 
 # ------------------------------ Tab 3: Validate Data (CSV + Excel match) ------------------------------
 class ValidateCSVTab(tk.Frame):
@@ -378,8 +451,18 @@ class ValidateCSVTab(tk.Frame):
         self.excel_path = ""
         self.output_dir = ""
         self.processing = False
-        self.cancel = False
-        self.excel_df = None
+        self.cancel = threading.Event()
+        self.mapping = None
+        self.rebuild_cache = tk.BooleanVar(value=False)
+        self.force = tk.BooleanVar(value=False)
+        self._force = False
+        self.checkpoints = tk.BooleanVar(value=False)
+        self._checkpoints = False
+        self.out_format = tk.StringVar(value="csv")
+        self._fmt = "csv"
+        self.write_report = tk.BooleanVar(value=False)
+        self._report = False
+        self.calls = MainLoopCalls(self)
         self._build_ui()
 
     def _build_ui(self):
@@ -427,6 +510,17 @@ class ValidateCSVTab(tk.Frame):
         self.run_btn.pack(side=tk.LEFT, padx=10)
         self.cancel_btn = ttk.Button(action, text="Cancel", command=self.request_cancel, state=tk.DISABLED)
         self.cancel_btn.pack(side=tk.LEFT, padx=8)
+        tk.Checkbutton(action, text="Rebuild Excel cache", variable=self.rebuild_cache,
+                       bg=CARD_BG, activebackground=CARD_BG).pack(side=tk.LEFT, padx=8)
+        tk.Checkbutton(action, text="Re-process unchanged files", variable=self.force,
+                       bg=CARD_BG, activebackground=CARD_BG).pack(side=tk.LEFT, padx=8)
+        tk.Checkbutton(action, text="Resume cancelled files", variable=self.checkpoints,
+                       bg=CARD_BG, activebackground=CARD_BG).pack(side=tk.LEFT, padx=8)
+        tk.Label(action, text="Output format", bg=CARD_BG, fg=TXT).pack(side=tk.LEFT, padx=(8, 4))
+        ttk.Combobox(action, textvariable=self.out_format, values=list(core.OUTPUT_FORMATS), state="readonly",
+                     width=8).pack(side=tk.LEFT)
+        tk.Checkbutton(action, text="Write run report", variable=self.write_report,
+                       bg=CARD_BG, activebackground=CARD_BG).pack(side=tk.LEFT, padx=8)
 
         # Console
         self.console = LogConsole(self)
@@ -442,7 +536,7 @@ class ValidateCSVTab(tk.Frame):
             self.console.log(f"Selected {len(self.csv_files)} CSV file(s)")
 
     def browse_excel(self):
-        if pd is None:
+        if not core.installed("pandas"):
             messagebox.showerror("Dependency missing", "pandas is required. Install with: pip install pandas openpyxl")
             return
         path = filedialog.askopenfilename(title="Select Excel", filetypes=[("Excel", "*.xlsx *.xls")])
@@ -460,23 +554,13 @@ class ValidateCSVTab(tk.Frame):
 
     def load_excel(self):
         try:
-            df = pd.read_excel(self.excel_path, engine='openpyxl')
-            df['File Name'] = (df['File Name'].astype(str).str.strip().str.lower().str.replace(r"\s+", "", regex=True).str.replace('sales_', 'sale_'))
-            self.excel_df = df
+            self.mapping = core.load_mapping(self.excel_path, rebuild=self.rebuild_cache.get(), log=self.console.log)
             return True, None
         except Exception as e:
             return False, f"Failed to read Excel: {e}"
 
-    def find_match_value(self, csv_filename):
-        base = os.path.basename(csv_filename).lower().replace(' ', '').replace('sales_', 'sale_')
-        m = self.excel_df[self.excel_df['File Name'].str.fullmatch(base, case=False)]
-        if not m.empty:
-            return m.iloc[0]['Add in File']
-        self.console.log(f"No match in Excel for: {os.path.basename(csv_filename)}")
-        return None
-
     def request_cancel(self):
-        self.cancel = True
+        self.cancel.set()
         self.status.config(text="Cancelling...", fg=WARN)
 
     def start(self):
@@ -496,59 +580,42 @@ class ValidateCSVTab(tk.Frame):
             messagebox.showerror("Excel", err)
             return
         self.processing = True
-        self.cancel = False
+        self.cancel.clear()
+        self._force = self.force.get()
+        self._checkpoints = self.checkpoints.get()
+        self._fmt = self.out_format.get()
+        self._report = self.write_report.get()
         self.run_btn.config(state=tk.DISABLED)
         self.cancel_btn.config(state=tk.NORMAL)
         self.progress['value'] = 0
         Thread(target=self._run, daemon=True).start()
 
+    def _show_progress(self, done, total, text):
+        self.calls.post(self._set_progress, (done / total) * 100, text)
+
+    def _set_progress(self, value, text):
+        self.progress['value'] = value
+        self.status.config(text=text)
+
     def _run(self):
-        t0 = time.time()
-        total = len(self.csv_files)
-        done = 0
-        for i, csv_path in enumerate(self.csv_files, 1):
-            if self.cancel:
-                break
-            try:
-                produced = self.process_single_csv(csv_path)
-                done += 1 if produced else 0
-            except Exception as e:
-                self.console.log(f"ERROR {os.path.basename(csv_path)}: {e}")
-            self.progress['value'] = (i/total) * 100
-            self.status.config(text=f"{i}/{total} file(s)")
+        try:
+            summary = core.run_validate(self.csv_files, self.excel_path, self.output_dir, log=self.console.log,
+                                        progress=self._show_progress, cancel=self.cancel, mapping=self.mapping,
+                                        force=self._force, checkpoints=self._checkpoints, fmt=self._fmt,
+                                        stats=core.RunStats() if self._report else None)
+        except Exception as e:
+            self.console.log(f"ERROR: {e}")
+            summary = None
+        self.calls.post(self._finish, summary)
+
+    def _finish(self, summary):
+        state = "Failed" if summary is None else "Cancelled" if summary["cancelled"] else "Complete"
         self.processing = False
         self.run_btn.config(state=tk.NORMAL)
         self.cancel_btn.config(state=tk.DISABLED)
-        self.status.config(text="Complete" if not self.cancel else "Cancelled", fg=SUCCESS if not self.cancel else ERROR)
-        if not self.cancel:
-            messagebox.showinfo("Done", f"Processed {done} file(s) in {time.time()-t0:.2f}s")
-
-    def process_single_csv(self, csv_path):
-        number_from_excel = self.find_match_value(csv_path)
-        if number_from_excel is None:
-            return False
-        try:
-            with open(csv_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read().splitlines()
-            out_lines = []
-            for line in content:
-                parts = line.split(',')
-                if len(parts) >= 7:
-                    try:
-                        third_col_value = parts[2].strip().split()[0]
-                        new_line = f"{','.join(parts[:6])},{number_from_excel},0,0,{third_col_value}"
-                        out_lines.append(new_line)
-                    except Exception:
-                        out_lines.append(line)
-            out_name = f"processed_{os.path.splitext(os.path.basename(csv_path))[0]}.csv"
-            out_path = os.path.join(self.output_dir, out_name)
-            with open(out_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(out_lines))
-            self.console.log(f"Created: {out_name}")
-            return True
-        except Exception as e:
-            self.console.log(f"Error {os.path.basename(csv_path)}: {e}")
-            return False
+        self.status.config(text=state, fg=SUCCESS if state == "Complete" else ERROR)
+        if state == "Complete":
+            messagebox.showinfo("Done", f"Processed {summary['processed']} file(s) in {summary['seconds']:.2f}s")
 
 # ------------------------------ Main App ------------------------------
 
@@ -586,6 +653,10 @@ class MasterSKUTab(tk.Frame):
         )
         self.unique_corporate_list_btn.grid(row=0, column=2, padx=10)
 
+        self.write_report = tk.BooleanVar(value=False)
+        tk.Checkbutton(frame, text="Write run report", variable=self.write_report,
+                       bg=BG, activebackground=BG).grid(row=1, column=0, columnspan=3, pady=(8, 0))
+
         # Status area
         self.status = tk.Text(self, height=12, wrap="word", font=("Consolas", 11))
         self.status.pack(padx=20, pady=20, fill=tk.BOTH, expand=True)
@@ -600,7 +671,9 @@ class MasterSKUTab(tk.Frame):
         self.status.see(tk.END)
 
     def upload_files(self):
-        self.files = filedialog.askopenfilenames(filetypes=[("CSV Files", "*.csv")])
+        self.files = filedialog.askopenfilenames(filetypes=[("CSV Files", "*.csv"),
+                                                            ("Compressed CSV Files", "*.csv.gz *.csv.zst"),
+                                                            ("Parquet Files", "*.parquet")])
         if len(self.files) < 2:
             messagebox.showwarning("Warning", "Please select at least 2 CSV files!")
             return
@@ -616,17 +689,12 @@ class MasterSKUTab(tk.Frame):
         try:
             self.progress["value"] = 0
             self.log("⚙️ Running Find New SKU...")
+            self.log(f"   New file: {os.path.basename(self.files[0])}; "
+                     f"master file(s): {', '.join(os.path.basename(f) for f in self.files[1:])}")
 
-            df1 = pd.read_csv(self.files[0])
-            df2 = pd.read_csv(self.files[1])
-
-            col1 = df1.iloc[:, 3]  # 4th column
-            col2 = df2.iloc[:, 3]
-
-            not_found = col1[~col1.isin(col2)].drop_duplicates()
-
-            out_file = os.path.join(os.getcwd(), "Logic1_New_SKU.csv")
-            not_found.to_csv(out_file, index=False, header=["NotFound_Values"])
+            out_file = os.path.join(os.getcwd(), core.NEW_SKU_NAME)
+            core.find_new_sku(self.files, out_file, log=self.log,
+                              stats=core.RunStats() if self.write_report.get() else None)
 
             self.progress["value"] = 100
             self.log(f"✅ Find New SKU Completed. Output saved as {out_file}")
@@ -641,16 +709,9 @@ class MasterSKUTab(tk.Frame):
             self.progress["value"] = 0
             self.log("⚙️ Running Unique Corporate List...")
 
-            df1 = pd.read_csv(self.files[0])
-            df2 = pd.read_csv(self.files[1])
-
-            col1 = df1.iloc[:, 0]
-            col2 = df2.iloc[:, 0]
-
-            unique_values = pd.Series(pd.concat([col1, col2]).drop_duplicates())
-
-            out_file = os.path.join(os.getcwd(), "Unique_Corporate_List.csv")
-            unique_values.to_csv(out_file, index=False, header=["Unique_Values"])
+            out_file = os.path.join(os.getcwd(), core.UNIQUE_CORPORATE_NAME)
+            core.unique_corporate_list(self.files, out_file, log=self.log,
+                                       stats=core.RunStats() if self.write_report.get() else None)
 
             self.progress["value"] = 100
             self.log(f"✅ Unique Corporate List Completed. Output saved as {out_file}")
@@ -694,19 +755,27 @@ class App(tk.Tk):
         tk.Label(title_bar, text=APP_TITLE, fg='white', bg=PRIMARY, font=('Segoe UI', 16, 'bold')).pack(side=tk.LEFT, padx=16, pady=10)
         tk.Label(title_bar, text='v1.1', fg='white', bg=PRIMARY, font=('Segoe UI', 10)).pack(side=tk.RIGHT, padx=16)
 
-        # Notebook Tabs
+        # Notebook Tabs: each tab's widgets are built the first time it is selected
         nb = ttk.Notebook(self)
         nb.pack(fill=tk.BOTH, expand=True)
-
-        self.tab1 = CleanCombineTab(nb)
-        self.tab2 = VerifySumsTab(nb)
-        self.tab3 = ValidateCSVTab(nb)
-        self.tab4 = MasterSKUTab(nb)
-
-        nb.add(self.tab1, text="Clean Data")
-        nb.add(self.tab2, text="Verify Sums")
-        nb.add(self.tab3, text="Validate CSV")
-        nb.add(self.tab4, text="Master SKU's")
+        self.nb = nb
+        self.tabs = {}
+        self._tab_classes = {}
+        for cls, text in [(CleanCombineTab, "Clean Data"), (VerifySumsTab, "Verify Sums"),
+                          (ValidateCSVTab, "Validate CSV"), (MasterSKUTab, "Master SKU's")]:
+            holder = tk.Frame(nb, bg=BG)
+            nb.add(holder, text=text)
+            self._tab_classes[str(holder)] = cls
+        nb.bind("<<NotebookTabChanged>>", self._show_tab)
+        self._show_tab()
+
+    def _show_tab(self, event=None):
+        holder = self.nb.select()
+        if holder in self.tabs or holder not in self._tab_classes:
+            return
+        tab = self._tab_classes[holder](self.nametowidget(holder))
+        tab.pack(fill=tk.BOTH, expand=True)
+        self.tabs[holder] = tab
 
 # -------------------------------------------------
 # Main Entry
@@ -717,4 +786,5 @@ def main():
     app.mainloop()
 
 if __name__ == "__main__":
+    mp.freeze_support()
     main()
@@ -0,0 +1,215 @@
+"""Headless benchmarks for every IQVIA Data operation, on data from iqvia_synth.py.
+
+    python iqvia_synth.py bench-data/ --size 200MB
+    python iqvia_bench.py bench-data/ --save baseline.json
+    python iqvia_bench.py bench-data/ --baseline baseline.json        # after a change
+
+Each operation runs in a fresh Python process so its peak memory is its own. The table
+shows wall time, rows/s and MB/s of input, and the peak RSS of the largest process (the
+main one or a clean worker). With --baseline, an operation that is more than --tolerance
+slower, or that needs more than --tolerance more memory, is reported as a REGRESSION and
+the exit code is 1. Baselines only compare meaningfully on the same machine and dataset.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import argparse
+import subprocess
+
+import iqvia_core as core
+
+OPERATIONS = ["clean", "verify", "validate", "new-sku", "unique-corporate"]
+
+
+def peak_rss():
+    """Peak resident memory in bytes of this process or its largest finished child, or None
+    when it cannot be measured (Windows without psutil)."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset
+        except Exception:
+            return None
+    scale = 1 if sys.platform == "darwin" else 1024   # ru_maxrss is in KB on Linux
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * scale
+
+
+def _check(summary):
+    if summary["errors"]:
+        raise RuntimeError(f"{len(summary['errors'])} input(s) failed, first: {summary['errors'][0]}")
+
+
+def run_operation(op, dataset, work_dir, workers=None):
+    """Run one operation on the dataset, writing into `work_dir`. Returns (rows, bytes) of input."""
+    log = lambda msg: None
+    os.environ["IQVIA_CACHE_DIR"] = os.path.join(work_dir, "cache")   # cold mapping cache every run
+    if op == "clean":
+        zips = dataset["zips"]
+        _check(core.run_clean([z["path"] for z in zips], work_dir, workers, log=log, force=True))
+        return sum(z["rows"] for z in zips), sum(z["bytes"] for z in zips)
+    if op == "verify":
+        csvs = dataset["csvs"]
+        _check(core.run_verify([c["path"] for c in csvs], work_dir, log=log, force=True, workers=workers))
+        return sum(c["rows"] for c in csvs), sum(c["bytes"] for c in csvs)
+    if op == "validate":
+        csvs = dataset["csvs"]
+        if not dataset.get("mapping"):
+            raise RuntimeError("the dataset has no mapping.xlsx (generate it with pandas installed)")
+        _check(core.run_validate([c["path"] for c in csvs], dataset["mapping"], work_dir, log=log, force=True,
+                                 workers=workers))
+        return sum(c["rows"] for c in csvs), sum(c["bytes"] for c in csvs)
+    skus = dataset["skus"]
+    paths = [s["path"] for s in skus]
+    if op == "new-sku":
+        core.find_new_sku(paths, os.path.join(work_dir, core.NEW_SKU_NAME))
+    elif op == "unique-corporate":
+        core.unique_corporate_list(paths, os.path.join(work_dir, core.UNIQUE_CORPORATE_NAME))
+    else:
+        raise ValueError(f"unknown operation {op!r}")
+    return sum(s["rows"] for s in skus), sum(s["bytes"] for s in skus)
+
+
+def measure(op, data_dir, workers=None):
+    """Run `op` in a child process and return its measurements."""
+    cmd = [sys.executable, os.path.abspath(__file__), data_dir, "--child", op]
+    if workers:
+        cmd += ["--workers", str(workers)]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{op} failed:\n{proc.stderr.strip()}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _child(op, data_dir, workers):
+    dataset = load_dataset(data_dir)
+    # The core imports pandas/openpyxl/pyarrow on first use; load them before the clock starts
+    # so that the timings are of the work, not of the imports
+    core.have_pandas(), core.have_openpyxl(), core.have_pyarrow()
+    with tempfile.TemporaryDirectory(prefix="iqvia_bench_") as work:
+        t0 = time.perf_counter()
+        rows, nbytes = run_operation(op, dataset, work, workers)
+        seconds = time.perf_counter() - t0
+    rss = peak_rss()
+    print(json.dumps({"seconds": round(seconds, 3), "rows": rows, "bytes": nbytes,
+                      "rows_per_s": round(rows / seconds, 1), "mb_per_s": round(nbytes / seconds / 1e6, 2),
+                      "peak_rss_mb": None if rss is None else round(rss / 1e6, 1)}))
+
+
+def load_dataset(data_dir):
+    """dataset.json of `data_dir`, with its paths made absolute."""
+    path = os.path.join(data_dir, "dataset.json")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"{path} not found; create the data with: python iqvia_synth.py {data_dir}")
+    with open(path, encoding="utf-8") as f:
+        dataset = json.load(f)
+    root = os.path.abspath(data_dir)
+    for group in ("zips", "csvs", "skus"):
+        for entry in dataset[group]:
+            entry["path"] = os.path.join(root, entry["path"])
+    if dataset.get("mapping"):
+        dataset["mapping"] = os.path.join(root, dataset["mapping"])
+    return dataset
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing each operation against `baseline`, and whether any regressed."""
+    lines, regressed = [], False
+    for op, cur in results.items():
+        base = baseline.get("operations", {}).get(op)
+        if base is None:
+            lines.append(f"{op}: not in the baseline")
+            continue
+        if base["rows"] != cur["rows"]:
+            lines.append(f"{op}: WARNING baseline was measured on a different dataset "
+                         f"({base['rows']:,} rows, now {cur['rows']:,})")
+        speed = cur["rows_per_s"] / base["rows_per_s"] - 1
+        verdict = "ok"
+        if speed < -tolerance:
+            verdict, regressed = "REGRESSION", True
+        lines.append(f"{op}: {speed:+.1%} rows/s vs baseline ... {verdict}")
+        if cur["peak_rss_mb"] and base.get("peak_rss_mb"):
+            growth = cur["peak_rss_mb"] / base["peak_rss_mb"] - 1
+            verdict = "ok"
+            if growth > tolerance:
+                verdict, regressed = "REGRESSION (memory)", True
+            lines.append(f"{op}: {growth:+.1%} peak RSS vs baseline ... {verdict}")
+    return lines, regressed
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="iqvia_bench.py", description=__doc__.splitlines()[0])
+    parser.add_argument("data", help="folder written by iqvia_synth.py")
+    parser.add_argument("--ops", default=",".join(OPERATIONS),
+                        help=f"comma-separated operations to run (default: {','.join(OPERATIONS)})")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="workers for clean, verify and validate (default: one per core)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per operation; the fastest is kept (default: 1)")
+    parser.add_argument("--save", metavar="FILE", help="write the results as JSON (use it later as --baseline)")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed slowdown / memory growth before failing, as a fraction (default: 0.10)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.child:
+        _child(args.child, args.data, args.workers)
+        return 0
+    ops = [op.strip() for op in args.ops.split(",") if op.strip()]
+    unknown = [op for op in ops if op not in OPERATIONS]
+    try:
+        if unknown:
+            raise ValueError(f"unknown operation(s): {', '.join(unknown)}")
+        dataset = load_dataset(args.data)
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+    except Exception as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+
+    results = {}
+    print(f"{'operation':<18}{'seconds':>10}{'rows/s':>14}{'MB/s':>10}{'peak RSS MB':>14}")
+    for op in ops:
+        try:
+            runs = [measure(op, args.data, args.workers) for _ in range(max(1, args.repeat))]
+        except Exception as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 2
+        best = min(runs, key=lambda r: r["seconds"])
+        results[op] = best
+        rss = "-" if best["peak_rss_mb"] is None else f"{best['peak_rss_mb']:,.1f}"
+        print(f"{op:<18}{best['seconds']:>10.2f}{best['rows_per_s']:>14,.0f}{best['mb_per_s']:>10.1f}{rss:>14}",
+              flush=True)
+
+    report = {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+              "workers": args.workers or core.default_workers(), "dataset": {"seed": dataset["seed"],
+                                                                             "size": dataset["size"]},
+              "operations": results}
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if baseline is None:
+        return 0
+    lines, regressed = compare(results, baseline, args.tolerance)
+    print()
+    for line in lines:
+        print(line)
+    if regressed:
+        print(f"\nREGRESSION: at least one operation is more than {args.tolerance:.0%} worse than the baseline",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
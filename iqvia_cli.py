@@ -0,0 +1,191 @@
+"""Headless batch runner for the IQVIA Data tool (no Tk required).
+
+    python iqvia_cli.py clean    drops/*.zip          -o cleaned/ --workers 8
+    python iqvia_cli.py clean    drops/*.zip          -o cleaned/ --format csv.zst --level 9
+    python iqvia_cli.py verify   cleaned/             -o reports/
+    python iqvia_cli.py verify   drops/*.zip          -o reports/
+    python iqvia_cli.py verify   cleaned/             -o reports/ --format json
+    python iqvia_cli.py validate cleaned/ --excel mapping.xlsx -o validated/
+    python iqvia_cli.py new-sku  new.csv master*.csv  -o out/
+    python iqvia_cli.py unique-corporate a.csv b.csv  -o out/
+
+Inputs may be files, glob patterns or directories. Log lines go to stderr and a JSON
+summary of the run goes to stdout (or to --summary FILE). The exit code is 0 when every
+input succeeded, 1 when any input failed, 2 when the run could not start and 130 when
+interrupted.
+
+clean, verify and validate keep a manifest in the output folder and skip inputs that are
+unchanged since the last run into it; --force processes everything again.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import multiprocessing as mp
+
+import iqvia_core as core
+
+
+def expand_inputs(patterns, exts):
+    """Turn files, glob patterns and directories into a de-duplicated, ordered list of files.
+    Directories contribute their files ending in one of `exts` (not recursive)."""
+    found = []
+    for pat in patterns:
+        if os.path.isdir(pat):
+            matches = sorted(os.path.join(pat, f) for f in os.listdir(pat)
+                             if f.lower().endswith(exts) and os.path.isfile(os.path.join(pat, f)))
+        elif any(ch in pat for ch in "*?["):
+            matches = sorted(glob.glob(pat, recursive=True))
+        else:
+            if not os.path.isfile(pat):
+                raise FileNotFoundError(f"No such file or directory: {pat}")
+            matches = [pat]
+        found.extend(matches)
+    return list(dict.fromkeys(found))
+
+
+# Inputs that verify, new-sku and unique-corporate read from a directory
+CSV_INPUTS = (".csv", ".csv.gz", ".csv.zst", ".parquet")
+
+
+def _log(args):
+    if args.quiet:
+        return lambda msg: None
+    return lambda msg: print(msg, file=sys.stderr, flush=True)
+
+
+def _stats(args):
+    """RunStats for --report / --trace-memory, or None."""
+    if args.report or args.trace_memory:
+        return core.RunStats(memory=args.trace_memory)
+    return None
+
+
+def _run_clean(args, log):
+    paths = expand_inputs(args.inputs, (".zip",))
+    return core.run_clean(paths, args.output, args.workers, stream=not args.no_stream, log=log, totals=args.totals,
+                          force=args.force, checkpoints=args.checkpoints, fmt=args.format, level=args.level,
+                          stats=_stats(args))
+
+
+def _run_verify(args, log):
+    paths = expand_inputs(args.inputs, CSV_INPUTS + (".zip",))
+    return core.run_verify(paths, args.output, log=log, force=args.force, stats=_stats(args),
+                           summary_format=args.format, workers=args.workers)
+
+
+def _run_validate(args, log):
+    paths = expand_inputs(args.inputs, (".csv",))
+    return core.run_validate(paths, args.excel, args.output, log=log, rebuild_cache=args.rebuild_cache,
+                             force=args.force, checkpoints=args.checkpoints, fmt=args.format, level=args.level,
+                             stats=_stats(args), workers=args.workers)
+
+
+def _run_sku(args, log, func, out_name, **options):
+    t0 = time.time()
+    paths = expand_inputs(args.inputs, CSV_INPUTS)
+    if len(paths) < 2:
+        raise ValueError("at least 2 CSV files are required")
+    os.makedirs(args.output, exist_ok=True)
+    out_file = os.path.join(args.output, out_name)
+    stats = _stats(args)
+    count = func(paths, out_file, log=log, stats=stats, **options)
+    log(f"Output saved as {out_file}")
+    summary = {"operation": args.command, "inputs": len(paths), "processed": len(paths), "skipped": [],
+               "outputs": [out_file], "values": count, "errors": [], "cancelled": False,
+               "seconds": round(time.time() - t0, 3)}
+    if stats is not None:
+        summary["report"] = stats.paths
+    return summary
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("inputs", nargs="+", help="files, glob patterns or directories")
+    common.add_argument("-o", "--output", default=".", help="output folder (default: current folder)")
+    common.add_argument("--summary", metavar="FILE", help="write the JSON summary here instead of stdout")
+    common.add_argument("-q", "--quiet", action="store_true", help="do not print log lines")
+    common.add_argument("--report", action="store_true",
+                        help="write per-file stage timings and counts to 'Run Report.json' and '.csv' in the output folder")
+    common.add_argument("--trace-memory", action="store_true",
+                        help="like --report, plus the peak traced memory of each stage (slower)")
+
+    parallel = argparse.ArgumentParser(add_help=False)
+    parallel.add_argument("--workers", type=int, default=None,
+                          help="files, or shards of one large uncompressed CSV, processed at once "
+                               "(default: one per CPU core)")
+
+    rerun = argparse.ArgumentParser(add_help=False)
+    rerun.add_argument("--force", action="store_true",
+                       help="process every input, even those unchanged since the last run into this folder")
+    resume = argparse.ArgumentParser(add_help=False)
+    resume.add_argument("--checkpoints", action="store_true",
+                        help="keep the partial output of an interrupted file and resume it on the next run")
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("--format", choices=list(core.OUTPUT_FORMATS), default="csv",
+                        help="format of the written files; csv.zst needs zstandard and parquet needs pyarrow "
+                             "(default: csv)")
+    output.add_argument("--level", type=int, default=None,
+                        help="compression level for csv.gz (1-9) and csv.zst (1-22) (default: 6 and 3)")
+
+    parser = argparse.ArgumentParser(prog="iqvia_cli.py", description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("clean", parents=[common, parallel, rerun, resume, output], help="clean the CSVs inside ZIP files")
+    p.add_argument("--no-stream", action="store_true", help="extract each ZIP to a temp folder first")
+    p.add_argument("--totals", action="store_true",
+                   help="also write Column Totals Summary.xlsx (input vs output) while cleaning")
+    p.set_defaults(func=_run_clean)
+
+    p = sub.add_parser("verify", parents=[common, parallel, rerun], help="sum columns 4, 5, 6 of CSVs (or of the CSVs inside ZIPs) into Column Totals Summary.xlsx")
+    p.add_argument("--format", choices=core.SUMMARY_FORMATS, default="xlsx",
+                   help="format of Column Totals Summary; csv and json need no openpyxl (default: xlsx)")
+    p.set_defaults(func=_run_verify)
+
+    p = sub.add_parser("validate", parents=[common, parallel, rerun, resume, output], help="transform CSVs using the Excel mapping")
+    p.add_argument("--excel", required=True, help="mapping workbook with 'File Name' and 'Add in File'")
+    p.add_argument("--rebuild-cache", action="store_true", help="re-parse the workbook even if it is cached")
+    p.set_defaults(func=_run_validate)
+
+    p = sub.add_parser("new-sku", parents=[common], help="SKUs (column 4) of the first file missing from all the others")
+    p.set_defaults(func=lambda args, log: _run_sku(args, log, core.find_new_sku, core.NEW_SKU_NAME))
+
+    p = sub.add_parser("unique-corporate", parents=[common, parallel],
+                       help="distinct column-1 values of all the files, with counts")
+    p.set_defaults(func=lambda args, log: _run_sku(args, log, core.unique_corporate_list, core.UNIQUE_CORPORATE_NAME,
+                                                   workers=args.workers))
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if hasattr(args, "level"):
+        try:   # a bad --level would otherwise only fail on the first output written
+            core.check_format(args.format, args.level)
+        except ValueError as e:
+            parser.error(str(e))
+    log = _log(args)
+    try:
+        summary = args.func(args, log)
+    except KeyboardInterrupt:
+        print("Interrupted", file=sys.stderr)
+        return 130
+    except Exception as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+
+    text = json.dumps(summary, indent=2)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    mp.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,2574 @@
+"""UI-free engine behind the IQVIA Data tool.
+
+Every operation the GUI offers (Clean Data, Verify Sums, Validate CSV, Master SKU's)
+lives here so it can run headless from `iqvia_cli.py` or be driven by the Tk tabs.
+Long-running operations take three optional hooks:
+
+    log(msg)                      one line of human-readable output
+    progress(done, total, text)   bytes processed so far, with throughput and ETA in `text`
+    cancel                        a threading.Event; set it to stop the run
+
+and return a plain summary dict that the CLI prints as JSON.
+"""
+import os
+import io
+import re
+import csv
+import gzip
+import json
+import math
+import mmap
+import zipfile
+import tempfile
+import time
+import queue
+import pickle
+import struct
+import shutil
+import hashlib
+import importlib.util
+import threading
+import tracemalloc
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, CancelledError, wait
+from contextlib import contextmanager, nullcontext
+from collections import Counter
+from itertools import islice
+from operator import itemgetter
+
+# Optional/extra deps (only used by specific operations). pandas, openpyxl and pyarrow take
+# seconds to import, so they are loaded on first use by have_pandas() / have_openpyxl() /
+# have_pyarrow(); until then, and when they are not installed, these names are None.
+pd = np = None           # pandas (and its numpy), for Validate (Excel matching), Master SKU's and fast Verify sums
+Workbook = None          # openpyxl, for Excel export
+pa = pc = pq = None      # pyarrow, for Parquet output
+_missing = set()         # optional modules that failed to import
+
+try:
+    import zstandard  # For .csv.zst input and output
+except Exception:
+    zstandard = None
+
+CANCEL_CHECK_ROWS = 5000        # how often a running task looks at the cancel flag
+IO_BUFFER = 1024 * 1024         # buffer size of large sequential reads and writes
+CHECKPOINT_ROWS = 500_000       # how often a resumable task commits its partial output
+REPORT_SECONDS = 0.5            # minimum gap between two progress reports
+
+
+def installed(name):
+    """True when module `name` is installed, without importing it (for quick UI checks)."""
+    return name not in _missing and importlib.util.find_spec(name) is not None
+
+
+def have_pandas():
+    """Import pandas on first use. False when it is not installed."""
+    global pd, np
+    if pd is None and "pandas" not in _missing:
+        try:
+            import pandas
+            import numpy
+            pd, np = pandas, numpy
+        except Exception:
+            _missing.add("pandas")
+    return pd is not None
+
+
+def have_openpyxl():
+    """Import openpyxl's Workbook on first use. False when it is not installed."""
+    global Workbook
+    if Workbook is None and "openpyxl" not in _missing:
+        try:
+            from openpyxl import Workbook
+        except Exception:
+            _missing.add("openpyxl")
+    return Workbook is not None
+
+
+def have_pyarrow():
+    """Import pyarrow (and its compute and parquet modules) on first use. False when it is not installed."""
+    global pa, pc, pq
+    if pa is None and "pyarrow" not in _missing:
+        try:
+            import pyarrow
+            import pyarrow.compute
+            import pyarrow.parquet
+            pa, pc, pq = pyarrow, pyarrow.compute, pyarrow.parquet
+        except Exception:
+            _missing.add("pyarrow")
+    return pa is not None
+
+
+class CancelledRun(Exception):
+    """Raised inside a task when the user cancels the run."""
+
+
+def _new_summary(operation, inputs):
+    return {"operation": operation, "inputs": len(inputs), "processed": 0, "skipped": [], "outputs": [],
+            "errors": [], "cancelled": False, "seconds": 0.0}
+
+
+def _error(summary, log, name, err, msg):
+    summary["errors"].append({"file": name, "error": str(err)})
+    log(msg)
+
+
+def _note_nulled(summary, log, out_path, n):
+    """Record in `summary["nulled_cells"]` that Parquet output `out_path` stored `n` non-numeric
+    cells of columns 4-6 as null."""
+    if n:
+        summary.setdefault("nulled_cells", {})[out_path] = n
+        log(f"WARNING: {os.path.basename(out_path)}: {n:,} non-numeric cell(s) in columns 4-6 stored as null")
+
+
+def _noop(*_):
+    pass
+
+
+SUM_COLUMNS = [3, 4, 5]          # 0-based positions of columns 4, 5 and 6
+SUM_BATCH_ROWS = 10_000          # rows whose columns 4-6 are converted and summed together
+SUM_READ_ROWS = 500              # csv rows read at a time by the pure-Python Verify path (divides CANCEL_CHECK_ROWS)
+PARSE_BLOCK = 256                # cells converted together once a list turns out to hold text
+_sum_cells = itemgetter(slice(SUM_COLUMNS[0], SUM_COLUMNS[-1] + 1))
+
+
+def exact_parts(values, quantum=None):
+    """A few floats (usually one or two) whose exact sum is the exact sum of `values`, so that
+    partial sums can be kept and added together later without any rounding on the way.
+    Each part is the rounded sum of what the earlier parts leave over, one pass per part plus
+    one that finds nothing left. With `quantum`, the exponent of a power of two that every
+    value is a multiple of, the second part is known to be exact and that last pass is saved."""
+    values = list(values)
+    parts = []
+    while True:
+        try:
+            total = math.fsum(values)
+        except (OverflowError, ValueError):   # a finite sum too large for a float, or inf - inf
+            return [sum(values)]
+        if total == 0:
+            return parts
+        parts.append(total)
+        if not math.isfinite(total):
+            return parts
+        # what is left after the first part is a multiple of 2**quantum below half its ulp
+        if len(parts) == 2 and quantum is not None and math.frexp(parts[0])[1] - 53 <= quantum + 54:
+            return parts
+        values.append(-total)
+
+
+def parse_numbers(cells):
+    """(the cells that `float()` accepts, as floats, number of the others that are not blank).
+    Converts the whole list at C speed when it can; otherwise PARSE_BLOCK cells at a time,
+    going cell by cell only through the blocks that hold a failing cell."""
+    try:
+        return list(map(float, cells)), 0
+    except ValueError:
+        pass
+    numbers, bad = [], 0
+    for start in range(0, len(cells), PARSE_BLOCK):
+        block = cells[start:start + PARSE_BLOCK]
+        try:
+            numbers.extend(list(map(float, block)))
+            continue
+        except ValueError:
+            pass
+        for cell in block:
+            try:
+                numbers.append(float(cell))
+            except ValueError:
+                if cell.strip():
+                    bad += 1
+    return numbers, bad
+
+
+class ColumnTotals:
+    """Running row count and column 4/5/6 sums, with the same rules as `sum_4_5_6`:
+    cells that do not parse as numbers (`float()`) are skipped, and counted unless blank.
+    The sums are kept exact (`exact_parts`) and rounded once, so the same cells give the same
+    totals whatever order, chunks or shards they are added in. `add` only keeps the cells,
+    which are converted a column at a time every SUM_BATCH_ROWS rows, and the numbers are
+    summed once SUM_BATCH_ROWS of them are waiting in a column."""
+    __slots__ = ("rows", "parts", "pending", "numbers", "bad")
+
+    def __init__(self):
+        self.rows = 0
+        self.parts = [[], [], []]
+        self.pending = []
+        self.numbers = [[], [], []]
+        self.bad = 0
+
+    def add(self, row):
+        self.rows += 1
+        self.pending.append(_sum_cells(row))
+        if len(self.pending) >= SUM_BATCH_ROWS:
+            self._fold()
+
+    def add_rows(self, rows):
+        """`add` for a list of rows at once, without keeping them."""
+        self.rows += len(rows)
+        self._add_columns(rows, SUM_COLUMNS)
+
+    def add_numbers(self, k, numbers, quantum=None):
+        """Add the list of floats `numbers` to column SUM_COLUMNS[k] (rows are counted by the
+        caller). `quantum` is passed on to `exact_parts`."""
+        if numbers:
+            self.parts[k] = exact_parts(self.parts[k] + exact_parts(numbers, quantum))
+
+    def add_cells(self, k, cells):
+        """Add the list of text `cells` to column SUM_COLUMNS[k] by the csv rules (see `parse_numbers`)."""
+        numbers, bad = parse_numbers(cells)
+        self.bad += bad
+        self.numbers[k] += numbers
+        if len(self.numbers[k]) >= SUM_BATCH_ROWS:
+            self.add_numbers(k, self.numbers[k])
+            self.numbers[k] = []
+
+    def _add_columns(self, rows, positions):
+        for k, idx in enumerate(positions):
+            try:
+                cells = list(map(itemgetter(idx), rows))
+            except IndexError:   # short rows have no cell here
+                cells = [row[idx] for row in rows if len(row) > idx]
+            self.add_cells(k, cells)
+
+    def _fold(self):
+        rows, self.pending = self.pending, []
+        self._add_columns(rows, range(len(SUM_COLUMNS)))
+        for k, numbers in enumerate(self.numbers):
+            self.add_numbers(k, numbers)
+        self.numbers = [[], [], []]
+
+    @property
+    def sums(self):
+        """The three sums, unrounded (each the float nearest to the exact sum)."""
+        self._fold()
+        return [math.fsum(parts) for parts in self.parts]
+
+    def tap(self, rows):
+        """Yield `rows` unchanged while adding each one."""
+        for row in rows:
+            self.add(row)
+            yield row
+
+    def result(self):
+        """(rows, sum col 4, sum col 5, sum col 6, non-numeric cells) as `sum_4_5_6` returns it."""
+        c4, c5, c6 = self.sums
+        return self.rows, round(c4, 2), round(c5, 2), round(c6, 2), self.bad
+
+    def merge(self, other):
+        """Add the rows and sums of `other` (e.g. another shard of the same file)."""
+        self.rows += other.rows
+        self._fold()
+        other._fold()
+        self.parts = [exact_parts(a + b) for a, b in zip(self.parts, other.parts)]
+        self.bad += other.bad
+
+    def state(self):
+        self._fold()
+        return [self.rows, [list(parts) for parts in self.parts], self.bad]
+
+    @classmethod
+    def from_state(cls, state):
+        acc = cls()
+        acc.rows, acc.bad = state[0], state[2]
+        # checkpoints written before the sums were exact hold one float per column
+        acc.parts = [list(s) if isinstance(s, list) else [s] for s in state[1]]
+        return acc
+
+
+class CountingReader(io.BufferedIOBase):
+    """Binary stream wrapper that keeps the number of bytes read so far in `pos`, so a task can
+    report how far into a file it is without counting anything in its parsing loop.
+    `seconds` is the time spent waiting on `raw` (disk, network share, ZIP inflate)."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.pos = 0
+        self.seconds = 0.0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self.raw.seekable()
+
+    def read(self, size=-1):
+        t0 = time.perf_counter()
+        data = self.raw.read(size)
+        self.seconds += time.perf_counter() - t0
+        self.pos += len(data)
+        return data
+
+    def read1(self, size=-1):
+        t0 = time.perf_counter()
+        data = self.raw.read1(size)
+        self.seconds += time.perf_counter() - t0
+        self.pos += len(data)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.pos = self.raw.seek(offset, whence)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+        super().close()
+
+
+def _mb(nbytes):
+    return f"{nbytes / 1e6:,.1f}"
+
+
+def _clock(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class RunProgress:
+    """Byte-based progress for a run over several inputs.
+    Register each input with `add(key, size, packed)` (`packed` = compressed size of a ZIP
+    member), then report with `update(key, bytes read, rows)` as often as convenient:
+    `hook(done bytes, total bytes, text)` is called at most every REPORT_SECONDS, with
+    MB done, MB/s, rows/s and an ETA in `text`."""
+
+    def __init__(self, hook, files_total, unit="file(s)"):
+        self.hook = hook
+        self.files_total = files_total
+        self.files_done = 0
+        self.unit = unit
+        self.detail = ""            # extra text appended to the status, e.g. per-worker rows
+        self.total = 0
+        self.packed_total = 0
+        self._size, self._ratio, self._done, self._rows = {}, {}, {}, {}
+        self._t0 = time.monotonic()
+        self._last = 0.0
+
+    def add(self, key, size, packed=None):
+        self._size[key] = size
+        self.total += size
+        if packed is not None:
+            self._ratio[key] = packed / size if size else 0.0
+            self.packed_total += packed
+
+    def update(self, key, nbytes, rows=None, force=False):
+        self._done[key] = min(nbytes, self._size.get(key, nbytes))
+        if rows is not None:
+            self._rows[key] = rows
+        self.report(force)
+
+    def complete(self, key, rows=None):
+        """Count all of `key` as read (finished, failed or skipped)."""
+        self.update(key, self._size.get(key, 0), rows)
+
+    def file_done(self):
+        self.files_done += 1
+        self.report(force=True)
+
+    def report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last < REPORT_SECONDS:
+            return
+        self._last = now
+        done = sum(self._done.values())
+        rows = sum(self._rows.values())
+        elapsed = max(now - self._t0, 1e-6)
+        rate = done / elapsed
+        size = f"{_mb(done)}/{_mb(self.total)} MB"
+        if self.packed_total:
+            packed = sum(n * self._ratio.get(key, 0.0) for key, n in self._done.items())
+            size += f" (ZIP {_mb(packed)}/{_mb(self.packed_total)} MB)"
+        parts = [f"{self.files_done}/{self.files_total} {self.unit} done", size, f"{_mb(rate)} MB/s"]
+        if rows:
+            parts.append(f"{rows / elapsed:,.0f} rows/s")
+        if 0 < done < self.total:
+            parts.append(f"ETA {_clock((self.total - done) / rate)}")
+        if self.detail:
+            parts.append(self.detail)
+        self.hook(done, self.total or 1, " • ".join(parts))
+
+
+def _file_progress(hook, paths):
+    """RunProgress over plain files, sized from disk (missing files count as empty)."""
+    meter = RunProgress(hook, len(paths))
+    for path in paths:
+        try:
+            meter.add(path, os.path.getsize(path))
+        except OSError:
+            meter.add(path, 0)
+    return meter
+
+
+# ------------------------------ Run report (stage timings) ------------------------------
+REPORT_NAME = "Run Report"        # written as "Run Report.json" and "Run Report.csv"
+RUN_KEY = "(run)"                 # report entry for stages that belong to no single input
+REPORT_COUNTERS = {"rows_in": "Rows In", "rows_out": "Rows Out", "bytes_read": "Bytes Read",
+                   "bytes_written": "Bytes Written"}
+
+
+class _TimedWrite:
+    """File-like object for csv.writer whose only method is a timed `write`."""
+
+    def __init__(self, write):
+        self.write = write
+
+
+class RunStats:
+    """Stage timings and counters per input, written out as the run report.
+    Time a block with `stage(file, name)` or every call of a function with `timed`, and add
+    counters with `count(file, rows_in=n, ...)`. With `memory`, each `stage` block also
+    records its tracemalloc peak. A pool task fills its own `child()`, which is sent back
+    and `merge`d. Code paths take `stats=None` and fall back to NO_STATS, which does nothing,
+    so an unreported run pays for nothing but a few attribute lookups per file."""
+
+    enabled = True
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.files = {}       # file -> {"stages": {name: [seconds, peak bytes]}, "counters": {name: n}}
+        self.paths = []       # the report files, once written
+        self._t0 = time.perf_counter()
+        self._tracing = memory and not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start()
+
+    def _entry(self, file):
+        entry = self.files.get(file)
+        if entry is None:
+            entry = self.files[file] = {"stages": {}, "counters": {}}
+        return entry
+
+    def _stage(self, file, name):
+        return self._entry(file)["stages"].setdefault(name, [0.0, None])
+
+    def seconds(self, file, name):
+        stage = self.files.get(file, {}).get("stages", {}).get(name)
+        return stage[0] if stage else 0.0
+
+    def add(self, file, name, seconds, peak=None):
+        stage = self._stage(file, name)
+        stage[0] += seconds
+        if peak is not None:
+            stage[1] = max(stage[1] or 0, peak)
+
+    def count(self, file, **counters):
+        totals = self._entry(file)["counters"]
+        for name, n in counters.items():
+            totals[name] = totals.get(name, 0) + n
+
+    @contextmanager
+    def stage(self, file, name, exclude=()):
+        """Time the block as stage `name` of `file`, less whatever the block adds to the
+        `exclude` stages (e.g. "read" and "write" timed inside a parse loop)."""
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()  # first stage in a pool worker
+            tracemalloc.reset_peak()
+        before = sum(self.seconds(file, s) for s in exclude)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0 - (sum(self.seconds(file, s) for s in exclude) - before)
+            self.add(file, name, elapsed, tracemalloc.get_traced_memory()[1] if self.memory else None)
+
+    def timed(self, fn, file, name):
+        """`fn`, wrapped so that the time spent in each call adds to stage `name` of `file`."""
+        stage = self._stage(file, name)
+        clock = time.perf_counter
+
+        def call(*args):
+            t0 = clock()
+            try:
+                return fn(*args)
+            finally:
+                stage[0] += clock() - t0
+        return call
+
+    def counted(self, rows, file, name):
+        """Pass `rows` through, adding how many there were to counter `name` of `file`."""
+        n = 0
+        try:
+            for row in rows:
+                n += 1
+                yield row
+        finally:
+            self.count(file, **{name: n})
+
+    def child(self):
+        return RunStats(self.memory)
+
+    def merge(self, other, key=None):
+        """Add the stages and counters of `other`; with `key`, all of them under that one
+        input (the shards of a file)."""
+        for file, entry in other.files.items():
+            file = key or file
+            for name, (seconds, peak) in entry["stages"].items():
+                self.add(file, name, seconds, peak)
+            self.count(file, **entry["counters"])
+
+    def report(self, operation):
+        """The report as a dict: every input's stages and counters, then their totals."""
+        def stages_of(stages):
+            return {name: {"seconds": round(s, 4), "peak_mb": None if peak is None else round(peak / 1e6, 2)}
+                    for name, (s, peak) in stages.items()}
+
+        totals = RunStats()
+        for entry in self.files.values():
+            for name, (seconds, peak) in entry["stages"].items():
+                totals.add(RUN_KEY, name, seconds, peak)
+            totals.count(RUN_KEY, **entry["counters"])
+        total = totals.files.get(RUN_KEY, {"stages": {}, "counters": {}})
+        return {"operation": operation, "seconds": round(time.perf_counter() - self._t0, 3), "memory": self.memory,
+                "files": [{"file": file, "stages": stages_of(entry["stages"]), **entry["counters"]}
+                          for file, entry in self.files.items()],
+                "totals": {"stages": stages_of(total["stages"]), **total["counters"]}}
+
+    def write(self, output_dir, operation):
+        """Write "Run Report.json" and a one-row-per-input "Run Report.csv" into `output_dir`
+        (stopping tracemalloc if this started it). Returns their paths."""
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        report = self.report(operation)
+        os.makedirs(output_dir, exist_ok=True)
+        json_path = os.path.join(output_dir, REPORT_NAME + ".json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+        names = list(dict.fromkeys(name for entry in report["files"] for name in entry["stages"]))
+        header = ["File"] + list(REPORT_COUNTERS.values()) + [f"{name} s" for name in names]
+        if self.memory:
+            header += [f"{name} peak MB" for name in names]
+        csv_path = os.path.join(output_dir, REPORT_NAME + ".csv")
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for entry in report["files"] + [dict(report["totals"], file="TOTAL")]:
+                stages = entry["stages"]
+                row = [entry["file"]] + [entry.get(c, "") for c in REPORT_COUNTERS]
+                row += [stages[name]["seconds"] if name in stages else "" for name in names]
+                if self.memory:
+                    row += [stages[name]["peak_mb"] if name in stages else "" for name in names]
+                writer.writerow(row)
+        self.paths = [json_path, csv_path]
+        return self.paths
+
+
+class _NoStats:
+    """RunStats stand-in for runs without a report: every method does nothing."""
+
+    enabled = False
+    memory = False
+
+    def add(self, *args, **kwargs):
+        pass
+
+    count = merge = add
+
+    def stage(self, *args, **kwargs):
+        return nullcontext()
+
+    def child(self):
+        return None
+
+
+NO_STATS = _NoStats()
+
+
+# ------------------------------ Run manifest (incremental re-runs) ------------------------------
+MANIFEST_NAME = ".iqvia_manifest.json"
+MANIFEST_SAVE_SECONDS = 2.0     # the manifest is rewritten at most this often during a run
+
+
+def file_sha256(path, block=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class RunManifest:
+    """What earlier runs produced in an output folder, so unchanged inputs can be skipped.
+    Entries are keyed on operation and input path (plus the member name for a ZIP member,
+    which is fingerprinted by its ZIP) and hold the input's size, mtime and
+    content hash, the settings used, the outputs (path and size) and any per-file results.
+    An input is current when its content hash and settings match and every output is still
+    on disk with the recorded size. The hash is only recomputed when size or mtime changed."""
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries = {}
+        self._stats = {}
+        self._hashes = {}           # (path, size, mtime) -> sha256, so a ZIP is hashed once for all its members
+        self._dirty = False
+        self._saved = time.monotonic()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", {})
+        except (OSError, ValueError, AttributeError):
+            pass  # no manifest yet, or unreadable: everything is treated as new
+
+    @staticmethod
+    def _key(operation, path, member=None):
+        key = f"{operation}::{os.path.abspath(path)}"
+        return key if member is None else f"{key}::{member}"
+
+    def _fingerprint(self, key, path):
+        st = os.stat(path)
+        old = self.entries.get(key, {})
+        if old.get("size") == st.st_size and old.get("mtime_ns") == st.st_mtime_ns:
+            sha = old.get("sha256")
+        else:
+            stamp = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+            sha = self._hashes.get(stamp) or file_sha256(path)
+            self._hashes[stamp] = sha
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+
+    def current(self, operation, path, settings=None, member=None):
+        """The recorded entry when `path` is unchanged since it was last processed with `settings`, else None."""
+        key = self._key(operation, path, member)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        try:
+            fp = self._fingerprint(key, path)
+        except OSError:
+            return None
+        self._stats[key] = fp
+        if fp["sha256"] != entry.get("sha256") or entry.get("settings") != (settings or {}):
+            return None
+        for out in entry.get("outputs", []):
+            try:
+                if os.path.getsize(out["path"]) != out["size"]:
+                    return None
+            except OSError:
+                return None
+        if fp["mtime_ns"] != entry.get("mtime_ns"):
+            entry["mtime_ns"] = fp["mtime_ns"]  # touched but identical: remember the new mtime
+            self._dirty = True
+        return entry
+
+    def record(self, operation, path, settings=None, outputs=(), member=None, **results):
+        """Remember that `path` was processed into `outputs`; extra keyword values are stored as-is."""
+        key = self._key(operation, path, member)
+        try:
+            fp = self._stats.pop(key, None) or self._fingerprint(key, path)
+            entry = dict(fp, settings=settings or {},
+                         outputs=[{"path": os.path.abspath(p), "size": os.path.getsize(p)} for p in outputs])
+        except OSError:
+            return
+        entry.update(results)
+        self.entries[key] = entry
+        self._dirty = True
+        self.save(force=False)
+
+    def save(self, force=True):
+        if not self._dirty or (not force and time.monotonic() - self._saved < MANIFEST_SAVE_SECONDS):
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".part", "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "entries": self.entries}, f, indent=1)
+        os.replace(self.path + ".part", self.path)
+        self._dirty = False
+        self._saved = time.monotonic()
+
+
+# ------------------------------ Checkpoints (resume a cancelled file) ------------------------------
+def source_id(path, member=None, **settings):
+    """Identity of an input for `Checkpoint`: path, ZIP member, size, mtime and any settings
+    that change the output. A checkpoint is only resumed when this matches exactly."""
+    st = os.stat(path)
+    return dict(settings, path=os.path.abspath(path), member=member, size=st.st_size, mtime_ns=st.st_mtime_ns)
+
+
+class Checkpoint:
+    """Resume point for one output file. While `<out>.part` is written, `<out>.ckpt` records how
+    many input rows were fully written and the size of `.part` at that moment. A cancelled run
+    keeps both; the next run over the same source truncates `.part` back to the committed size
+    and carries on from the following row."""
+
+    def __init__(self, out_path, source):
+        self.part = out_path + ".part"
+        self.path = out_path + ".ckpt"
+        self.source = source
+
+    def load(self):
+        """(rows already written, saved state) to resume from, or (0, None) to start afresh."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state["source"] == self.source and os.path.getsize(self.part) >= state["bytes"]:
+                os.truncate(self.part, state["bytes"])
+                return state["rows"], state
+        except (OSError, ValueError, KeyError):
+            pass
+        return 0, None
+
+    def save(self, rows, nbytes, **extra):
+        state = dict(extra, source=self.source, rows=rows, bytes=nbytes)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _commit_every(rows, commit, start=0, every=CHECKPOINT_ROWS):
+    """Pass rows through, calling `commit(n)` just before row n + 1 for each multiple n of `every`
+    past `start`; the consumer has finished with the first n rows by then."""
+    for n, row in enumerate(rows):
+        if n > start and n % every == 0:
+            commit(n)
+        yield row
+
+
+def _discard_partial(tmp_path, ckpt, keep):
+    """Remove a half-written output, unless `keep` and a checkpoint can resume it."""
+    if keep and ckpt is not None and ckpt.exists():
+        return
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    if ckpt is not None:
+        ckpt.clear()
+
+
+# ------------------------------ Output formats ------------------------------
+# output format -> file extension
+OUTPUT_FORMATS = {"csv": ".csv", "csv.gz": ".csv.gz", "csv.zst": ".csv.zst", "parquet": ".parquet"}
+COMPRESS_LEVELS = {"csv.gz": 6, "csv.zst": 3}   # default level of each compressed CSV format
+LEVEL_RANGES = {"csv.gz": (1, 9), "csv.zst": (1, 22)}   # levels accepted for each compressed CSV format
+PARQUET_ROW_GROUP_ROWS = 250_000
+
+
+def _require_pyarrow():
+    if not have_pyarrow():
+        raise RuntimeError("pyarrow is required for Parquet. Install with: pip install pyarrow")
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise RuntimeError("zstandard is required for .zst files. Install with: pip install zstandard")
+
+
+def check_format(fmt, level=None):
+    """Raise before any work starts if `fmt` is unknown or its library is not installed, or if
+    `level` is given for a format that is not compressed or lies outside LEVEL_RANGES."""
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"unknown output format {fmt!r} (expected one of: {', '.join(OUTPUT_FORMATS)})")
+    if level is not None:
+        if fmt not in LEVEL_RANGES:
+            raise ValueError(f"a compression level applies to {' and '.join(LEVEL_RANGES)} only, not {fmt}")
+        low, high = LEVEL_RANGES[fmt]
+        if not low <= level <= high:
+            raise ValueError(f"compression level {level} is out of range for {fmt} ({low}-{high})")
+    if fmt == "parquet":
+        _require_pyarrow()
+    elif fmt == "csv.zst":
+        _require_zstandard()
+
+
+def open_csv_output(path, fmt="csv", level=None, append=False, newline=None, buffering=-1):
+    """Text stream for a CSV output. "csv" is a plain file; "csv.gz" and "csv.zst" go through
+    a streaming compressor at `level` (default COMPRESS_LEVELS) and cannot be appended to."""
+    if fmt == "csv":
+        return open(path, "a" if append else "w", encoding="utf-8", newline=newline, buffering=buffering)
+    level = COMPRESS_LEVELS[fmt] if level is None else level
+    if fmt == "csv.gz":
+        raw = gzip.open(path, "wb", compresslevel=level)
+    else:
+        _require_zstandard()
+        raw = zstandard.ZstdCompressor(level=level).stream_writer(open(path, "wb"), closefd=True)
+    return io.TextIOWrapper(raw, encoding="utf-8", newline=newline)
+
+
+def is_csv(path):
+    return str(path).lower().endswith((".csv", ".csv.gz", ".csv.zst"))
+
+
+def decompressed(raw, path):
+    """`raw`, a binary stream of `path`, decompressed on the fly when the name ends in .gz
+    or .zst. Closing the result does not close `raw`."""
+    name = str(path).lower()
+    if name.endswith(".gz"):
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if name.endswith(".zst"):
+        _require_zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=False)
+    return nullcontext(raw)
+
+
+def split_member_key(path):
+    """(ZIP path, member name) of a `member_key` such as "drop.zip::a.csv", or (path, None)."""
+    head, sep, member = str(path).partition("::")
+    if sep and head.lower().endswith(".zip"):
+        return head, member
+    return path, None
+
+
+@contextmanager
+def open_input(path, span=None):
+    """Binary stream of `path`, which may also be a ZIP member written as a `member_key`.
+    Each call opens its own ZipFile, so threads reading members of one ZIP share no handle.
+    With `span`, a (start, end) byte range from `record_span`, only that part is read, from
+    the file on disk (the ZIP itself for a stored member, see `raw_extent`)."""
+    zip_path, member = split_member_key(path)
+    if span is not None:
+        with open_range(zip_path, *span) as f:
+            yield f
+        return
+    if member is None:
+        with open(path, "rb") as f:
+            yield f
+        return
+    with zipfile.ZipFile(zip_path, "r") as z, z.open(member) as f:
+        yield f
+
+
+def is_parquet(path):
+    return str(path).lower().endswith(".parquet")
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):   # TypeError: None, a cell padded by ParquetRowWriter
+        return None
+
+
+def parquet_schema(width):
+    """col1..col<width> as strings, except columns 4-6 as float64."""
+    return pa.schema([pa.field(f"col{i + 1}", pa.float64() if i in SUM_COLUMNS else pa.string())
+                      for i in range(width)])
+
+
+class ParquetRowWriter:
+    """csv.writer-like sink that writes rows to a Parquet file, one row group at a time.
+    The schema (`parquet_schema`) has `width` columns, or as many as the first row has
+    fields. Shorter rows are padded with nulls, and the fields of a longer row from the
+    last column on are kept, comma-joined, in that column. Blank and non-numeric cells of
+    columns 4-6 are stored as null; `nulled` counts the non-numeric ones.
+    A file with no rows still gets the columns, SUM_COLUMNS[-1] + 1 of them when neither
+    `width` nor a row gives the number."""
+
+    def __init__(self, path, row_group_rows=PARQUET_ROW_GROUP_ROWS, width=None):
+        _require_pyarrow()
+        self.path = path
+        self.row_group_rows = row_group_rows
+        self.width = width
+        self.rows = 0
+        self.nulled = 0
+        self._batch = []
+        self._schema = None
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is None:
+            self.close()
+        elif self._writer is not None:
+            self._writer.close()
+
+    def writerow(self, row):
+        self._batch.append(row)
+        if len(self._batch) >= self.row_group_rows:
+            self._flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self._batch.append(row)
+            if len(self._batch) >= self.row_group_rows:
+                self._flush()
+
+    def _flush(self):
+        batch = self._batch
+        if not batch:
+            return
+        if self._writer is None:
+            self._schema = parquet_schema(self.width or len(batch[0]))
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression="zstd")
+        width = len(self._schema)
+        batch = [row if len(row) == width else
+                 list(row) + [None] * (width - len(row)) if len(row) < width else
+                 list(row[:width - 1]) + [",".join(row[width - 1:])]
+                 for row in batch]
+        arrays = []
+        for i, col in enumerate(zip(*batch)):
+            if i in SUM_COLUMNS:
+                values = [_to_float(v) for v in col]
+                nulls = values.count(None)
+                if nulls > col.count("") + col.count(None):   # more than the blank cells
+                    self.nulled += sum(1 for v, x in zip(col, values) if x is None and v and v.strip())
+                arrays.append(pa.array(values, pa.float64()))
+            else:
+                arrays.append(pa.array(col, pa.string()))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        self.rows += len(batch)
+        self._batch = []
+
+    def close(self):
+        self._flush()
+        if self._writer is None:   # no rows at all
+            pq.write_table(parquet_schema(self.width or SUM_COLUMNS[-1] + 1).empty_table(), self.path)
+        else:
+            self._writer.close()
+
+
+# ------------------------------ Byte-range shards (one huge CSV on several cores) ------------------------------
+SHARD_MIN_BYTES = 256 * 1024 * 1024   # inputs smaller than this are processed whole
+SHARD_SYNC_BYTES = 1024 * 1024       # how far a shard edge reads at a time for the next record
+
+
+class RangeReader(io.RawIOBase):
+    """Bytes [start, end) of a file as a stream of their own, positioned from 0."""
+
+    def __init__(self, path, start, end):
+        self._f = open(path, "rb")
+        self.start, self.end = start, end
+        self._pos = start
+        self._f.seek(start)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), self.end - self._pos)
+        if n <= 0:
+            return 0
+        got = self._f.readinto(memoryview(b)[:n])
+        self._pos += got
+        return got
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: self.start, io.SEEK_CUR: self._pos, io.SEEK_END: self.end}[whence]
+        self._pos = min(max(base + offset, self.start), self.end)
+        self._f.seek(self._pos)
+        return self._pos - self.start
+
+    def tell(self):
+        return self._pos - self.start
+
+    def close(self):
+        if not self.closed:
+            self._f.close()
+        super().close()
+
+
+def open_range(path, start, end):
+    """Buffered binary stream of bytes [start, end) of `path`."""
+    return io.BufferedReader(RangeReader(path, start, end), IO_BUFFER)
+
+
+def raw_extent(path):
+    """(file, start, end) where the bytes of input `path` lie uncompressed on disk: a plain
+    .csv itself, or a ZIP member stored without compression inside its archive. None when
+    they are compressed (deflated members, .gz, .zst), which cannot be read from the middle."""
+    zip_path, member = split_member_key(path)
+    if member is None:
+        if not str(path).lower().endswith(".csv"):
+            return None
+        return path, 0, os.path.getsize(path)
+    with zipfile.ZipFile(zip_path, "r") as z:
+        info = z.getinfo(member)
+    if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:   # 0x1: encrypted
+        return None
+    with open(zip_path, "rb") as f:
+        f.seek(info.header_offset)
+        header = f.read(30)                  # local file header; name and extra lengths at 26
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    start = info.header_offset + 30 + name_len + extra_len
+    return zip_path, start, start + info.file_size
+
+
+def sync_record(path, pos, end, quoted=True, delimiter=","):
+    """Offset just after the first newline at or after `pos` in `path` that ends a record, or
+    `end` when there is none. Without `quoted` (line-based inputs) that is any newline. With
+    it, the newline must lie outside quotes. The quotes before `pos` are not counted; whether
+    `pos` is inside a quoted field is read from the first quote after it that a valid CSV
+    allows only one way: after a delimiter or line break and before a field character it
+    opens a field, and after a field character (not a quote) and before a delimiter, line
+    break, quote or the end it closes one or starts an escaped quote, i.e. it is inside one.
+    Without such a quote, a file that ends within reach must end outside quotes, which fixes
+    the state at `pos` too; and bytes without any quote that hold a line break are taken to
+    be outside (a plain, unquoted CSV).
+    SHARD_SYNC_BYTES are read at first; a quoted field or line longer than that, which leaves
+    the state or the boundary open, makes it read on, SHARD_SYNC_BYTES at a time. The boundary
+    may then lie beyond the next shard edge: that shard is left empty, its records going to
+    the one before. Two shards meeting at `pos` find the same boundary."""
+    limit = min(end, pos + SHARD_SYNC_BYTES)
+    with open(path, "rb") as f:
+        f.seek(pos - 1)
+        before = f.read(1)
+        data = f.read(limit - pos)
+        while True:
+            found = _find_record_end(data, before, limit == end, quoted, delimiter)
+            if found is not None:
+                return pos + found
+            if limit == end:
+                return end
+            more = f.read(min(SHARD_SYNC_BYTES, end - limit))
+            data += more
+            limit += len(more)
+
+
+def _find_record_end(data, before, at_end, quoted, delimiter):
+    """Offset in `data` just after the newline `sync_record` looks for, where `before` is the
+    byte before `data` and `at_end` says whether the input ends with it. None when `data` does
+    not settle it."""
+    if not quoted:
+        nl = data.find(b"\n")
+        return nl + 1 if nl >= 0 else None
+    stops = delimiter.encode() + b"\r\n"
+    seen = 0                 # quotes between `pos` and the one looked at
+    i = data.find(b'"')
+    while i >= 0:
+        after = data[i + 1:i + 2]
+        if not after and not at_end:
+            return None      # the byte after it is not read yet
+        prev = data[i - 1:i] if i else before
+        opens = prev in stops
+        closes = not after or after in stops or after == b'"'
+        if prev != b'"' and opens != closes:
+            inside = closes != (seen % 2 == 1)   # the state at `pos`, before the `seen` quotes
+            break
+        seen += 1            # ,"" ,", "" or a"b: could be read either way
+        i = data.find(b'"', i + 1)
+    else:
+        if at_end:
+            inside = seen % 2 == 1
+        elif not seen and b"\n" in data:
+            inside = False
+        else:
+            return None
+    start = 0
+    while True:
+        nl = data.find(b"\n", start)
+        if nl < 0:
+            return len(data) if at_end else None
+        if data.count(b'"', start, nl) % 2:
+            inside = not inside
+        if not inside:
+            return nl + 1
+        start = nl + 1
+
+
+def record_span(path, span, quoted=True, delimiter=","):
+    """The bytes (start, end) of input `path` that shard `span` from `plan_shards` covers: its
+    inner edges moved on to the next record boundary (see `sync_record`). The shards of a file
+    still meet end to end, and the first and last keep the edges of the file; a shard that
+    holds no record boundary of its own is left empty."""
+    file, first, last = raw_extent(path)
+    return tuple(x if x in (first, last) else sync_record(file, x, last, quoted, delimiter) for x in span)
+
+
+def plan_shards(path, workers):
+    """Byte ranges of about equal size to split input `path` into, one per worker, or None to
+    process it whole: fewer than 2 workers, smaller than SHARD_MIN_BYTES or compressed.
+    Nothing is read here; each worker finds the record boundaries of its range (`record_span`)."""
+    if workers < 2:
+        return None
+    try:
+        extent = raw_extent(path)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+    if extent is None or extent[2] - extent[1] < SHARD_MIN_BYTES:
+        return None
+    _, start, end = extent
+    cuts = [start + (end - start) * n // workers for n in range(workers + 1)]
+    return list(zip(cuts, cuts[1:]))
+
+
+def shard_key(key, n):
+    """Progress/report key of shard `n` (from 1) of input `key`: `<key>#<n>`."""
+    return f"{key}#{n}"
+
+
+def join_parts(parts, out_path, sep):
+    """Concatenate the files `parts` in order into `out_path` with `sep` between two
+    non-empty ones, and delete them. The first non-empty part is renamed, not copied."""
+    kept = [p for p in parts if os.path.getsize(p)] or parts[:1]
+    os.replace(kept[0], out_path)
+    with open(out_path, "ab") as dst:
+        for part in kept[1:]:
+            dst.write(sep)
+            with open(part, "rb") as src:
+                shutil.copyfileobj(src, dst, IO_BUFFER)
+    for part in parts:
+        if part != kept[0]:
+            os.remove(part)
+
+
+# ------------------------------ Clean Data (ZIP -> individual cleaned CSVs) ------------------------------
+def drop_header_trailer(rows, head=True, tail=True):
+    """Streaming equivalent of `rows[1:-1] if len(rows) > 2 else rows`.
+    Uses one row of lookahead so the trailer is known only when the input ends.
+    For a shard of a file (see `plan_shards`), `head` and `tail` say whether it starts and
+    ends the file: only those edges lose their row, as the whole file has more than 2 rows."""
+    it = iter(rows)
+    if not (head and tail):
+        if head:
+            next(it, None)
+        if not tail:
+            yield from it
+            return
+        pending = next(it, None)
+        if pending is None:
+            return
+        for row in it:
+            yield pending
+            pending = row
+        return
+    head = list(islice(it, 3))
+    if len(head) < 3:
+        yield from head
+        return
+    yield head[1]
+    pending = head[2]
+    for row in it:
+        yield pending
+        pending = row
+
+
+def clean_rows(rows, suffix_label):
+    """Strip quotes/whitespace, drop short rows and rows where col 2 == col 3."""
+    for cols in rows:
+        cols = [c.replace('"', '').strip() for c in cols]
+        if len(cols) < 3:
+            continue
+        if cols[1].strip().lower() == cols[2].strip().lower():
+            continue
+        cols.append(suffix_label)
+        yield cols
+
+
+def _watch_rows(rows, key, cancel=None, progress=None, meter=None):
+    """Pass rows through unchanged, checking `cancel` every few thousand rows and putting
+    (pid, key, rows, bytes read from `meter`) on `progress` at most every REPORT_SECONDS."""
+    pid = os.getpid()
+    n = 0
+    last = time.monotonic()
+    for row in rows:
+        n += 1
+        if n % CANCEL_CHECK_ROWS == 0:
+            if cancel is not None and cancel.is_set():
+                raise CancelledRun(key)
+            if progress is not None and time.monotonic() - last >= REPORT_SECONDS:
+                last = time.monotonic()
+                progress.put((pid, key, n, meter.pos if meter is not None else 0))
+        yield row
+    if progress is not None:
+        progress.put((pid, key, n, meter.pos if meter is not None else 0))
+
+
+def sniff_delimiter(file):
+    """Guess the delimiter from the first 4 KB of an open text stream, then rewind it."""
+    sample = file.read(4096)
+    file.seek(0)
+    try:
+        return csv.Sniffer().sniff(sample).delimiter
+    except csv.Error:
+        return ","
+
+
+def clean_csv(src, suffix_label, out_path, label="", cancel=None, progress=None, totals=None, meter=None,
+              resume=None, fmt="csv", level=None, stats=None, delimiter=None, edges=(True, True), counts=None):
+    """Clean one CSV (a path or an open text stream) into `out_path`.
+    Rows are streamed from input to output; the file is written as `<out_path>.part`
+    and renamed only when complete. Pass a dict as `totals` to also get the Verify Sums
+    numbers for the input rows ("input") and the written rows ("output") in the same pass.
+    `meter` is the CountingReader under a stream `src`, for byte progress.
+    Pass the `source_id` of the input as `resume` to commit a `Checkpoint` every
+    CHECKPOINT_ROWS rows: a cancelled file then continues from there on the next call.
+    `fmt` picks the output format (see OUTPUT_FORMATS) and `level` the compression level of
+    "csv.gz"/"csv.zst"; checkpoints apply to plain "csv" only. Pass a dict as `counts` to
+    get `counts["nulled"]`, the non-numeric cells of columns 4-6 that Parquet stored as null.
+    `stats` (a RunStats) gets the sniff, read, parse+clean and write times and the row and
+    byte counts of this file.
+    A shard of a file passes the `delimiter` sniffed from the start of the file and `edges`,
+    the (head, tail) of `drop_header_trailer`."""
+    stats = stats or NO_STATS
+    key = label or os.path.basename(out_path)
+    if isinstance(src, (str, os.PathLike)):
+        meter = CountingReader(open(src, "rb"))
+        source = io.TextIOWrapper(meter, encoding="utf-8-sig", newline="")
+    else:
+        source = nullcontext(src)
+
+    tmp_path = out_path + ".part"
+    resumable = resume is not None and fmt == "csv"
+    ckpt = Checkpoint(out_path, dict(resume, totals=totals is not None)) if resumable else None
+    start, state = ckpt.load() if ckpt is not None else (0, None)
+
+    def commit(n):
+        f.flush()
+        ckpt.save(n, f.tell(), totals=totals["output"].state() if totals is not None else None)
+
+    try:
+        with source as file:
+            if delimiter is None:
+                with stats.stage(key, "sniff"):
+                    delimiter = sniff_delimiter(file)
+            rows = csv.reader(file, delimiter=delimiter)
+            if stats.enabled:
+                rows = stats.counted(rows, key, "rows_in")
+            if totals is not None:
+                totals["input"] = ColumnTotals()
+                totals["output"] = ColumnTotals.from_state(state["totals"]) if start else ColumnTotals()
+                rows = totals["input"].tap(rows)
+            rows = drop_header_trailer(rows, *edges)
+            rows = _watch_rows(rows, key, cancel, progress, meter)
+            if ckpt is not None:
+                rows = islice(_commit_every(rows, commit, start), start, None)
+            cleaned = clean_rows(rows, suffix_label)
+            if totals is not None:
+                cleaned = totals["output"].tap(cleaned)
+            if stats.enabled:
+                cleaned = stats.counted(cleaned, key, "rows_out")
+            read_before = meter.seconds if meter is not None else 0.0
+            with stats.stage(key, "parse+clean", exclude=("read", "write")):
+                if fmt == "parquet":
+                    with ParquetRowWriter(tmp_path) as writer:
+                        if stats.enabled:
+                            writer._flush = stats.timed(writer._flush, key, "write")
+                        writer.writerows(cleaned)
+                    if counts is not None:
+                        counts["nulled"] = writer.nulled
+                else:
+                    with open_csv_output(tmp_path, fmt, level, append=bool(start), newline="") as f:
+                        writer = csv.writer(_TimedWrite(stats.timed(f.write, key, "write")) if stats.enabled else f)
+                        writer.writerows(cleaned)
+                if meter is not None:
+                    stats.add(key, "read", meter.seconds - read_before)
+            if stats.enabled:
+                stats.count(key, bytes_read=meter.pos if meter is not None else 0,
+                            bytes_written=os.path.getsize(tmp_path))
+        os.replace(tmp_path, out_path)
+    except BaseException as e:
+        _discard_partial(tmp_path, ckpt, keep=isinstance(e, (CancelledRun, KeyboardInterrupt)))
+        raise
+    if ckpt is not None:
+        ckpt.clear()
+    return out_path
+
+
+def csv_members(zip_path):
+    """ZipInfo of the .csv members of a ZIP, in archive order (reads only the central directory)."""
+    with zipfile.ZipFile(zip_path, 'r') as z:
+        return [i for i in z.infolist() if not i.is_dir() and i.filename.lower().endswith('.csv')]
+
+
+def member_key(zip_path, member):
+    """Progress/error key of a ZIP member: `<zip path>::<member name>`."""
+    return f"{zip_path}::{member}"
+
+
+def clean_zip_member(zip_path, member, suffix_label, out_path, cancel=None, progress=None, totals=None,
+                     checkpoints=False, fmt="csv", level=None, stats=None, counts=None):
+    """Stream one CSV member straight out of the ZIP through `clean_csv`."""
+    stats = stats or NO_STATS
+    resume = source_id(zip_path, member) if checkpoints else None
+    key = member_key(zip_path, member)
+    with stats.stage(key, "open"):
+        z = zipfile.ZipFile(zip_path, 'r')
+    with z:
+        with z.open(member) as raw:
+            meter = CountingReader(raw)
+            with io.TextIOWrapper(meter, encoding="utf-8-sig", newline="") as stream:
+                return clean_csv(stream, suffix_label, out_path, key, cancel, progress,
+                                 totals, meter, resume, fmt, level, stats, counts=counts)
+
+
+def clean_output_path(output_dir, zip_path, member, several=False, fmt="csv"):
+    """Where Clean writes ZIP member `member`: `<zip name>_processed.csv` (or the extension of
+    `fmt`), or `<zip name>_<member path>_processed.csv` when the ZIP holds `several` CSVs, so
+    that each member gets its own file. Folders in the member path become "_"."""
+    zip_base = os.path.splitext(os.path.basename(zip_path))[0]
+    if several:
+        zip_base += "_" + os.path.splitext(member)[0].replace("/", "_")
+    return os.path.join(output_dir, f"{zip_base}_processed{OUTPUT_FORMATS[fmt]}")
+
+
+def clean_zip_extracted(zip_path, output_folder, cancel=None, progress=None, with_totals=False, checkpoints=False,
+                        fmt="csv", level=None, stats=None):
+    """Legacy mode: extract the whole ZIP to a temp folder, then clean each CSV (output names
+    as `clean_output_path`).
+    Returns ([(created path, totals or None)], [(csv name, error message)],
+    {created path: non-numeric cells Parquet stored as null})."""
+    created, errors, nulled = [], [], {}
+    zip_base = os.path.splitext(os.path.basename(zip_path))[0]
+
+    stats = stats or NO_STATS
+    with zipfile.ZipFile(zip_path, 'r') as z:
+        with tempfile.TemporaryDirectory() as tmp:
+            with stats.stage(zip_path, "extract"):
+                z.extractall(tmp)
+            csv_files = [os.path.join(root, file) for root, _, files in os.walk(tmp)
+                         for file in files if file.lower().endswith('.csv')]
+            for csv_file in csv_files:
+                file = os.path.basename(csv_file)
+                totals = {} if with_totals else None
+                counts = {}
+                member = os.path.relpath(csv_file, tmp).replace(os.sep, "/")
+                out_path = clean_output_path(output_folder, zip_path, member, len(csv_files) > 1, fmt)
+                resume = source_id(zip_path, member) if checkpoints else None
+                try:
+                    clean_csv(csv_file, zip_base, out_path, member_key(zip_path, member),
+                              cancel, progress, totals, resume=resume, fmt=fmt, level=level,
+                              stats=stats, counts=counts)
+                    created.append((out_path, totals))
+                    nulled[out_path] = counts.get("nulled", 0)
+                except CancelledRun:
+                    raise
+                except Exception as e:
+                    errors.append((file, str(e)))
+    return created, errors, nulled
+
+
+# Set in each pool worker by `_pool_init`; mp.Event/Queue can only reach workers this way.
+_worker_cancel = None
+_worker_progress = None
+
+
+def _pool_init(cancel, progress):
+    global _worker_cancel, _worker_progress
+    _worker_cancel = cancel
+    _worker_progress = progress
+
+
+def _clean_member_task(zip_path, member, suffix_label, out_path, with_totals=False, checkpoints=False, fmt="csv",
+                       level=None, stats=None):
+    totals = {} if with_totals else None
+    counts = {}
+    out_path = clean_zip_member(zip_path, member, suffix_label, out_path, _worker_cancel, _worker_progress, totals,
+                                checkpoints, fmt, level, stats, counts)
+    return out_path, totals, stats, counts.get("nulled", 0)
+
+
+def _clean_extracted_task(zip_path, output_folder, with_totals=False, checkpoints=False, fmt="csv", level=None,
+                          stats=None):
+    created, errors, nulled = clean_zip_extracted(zip_path, output_folder, _worker_cancel, _worker_progress,
+                                                  with_totals, checkpoints, fmt, level, stats)
+    return created, errors, stats, nulled
+
+
+def _clean_shard_task(zip_path, member, span, delimiter, suffix_label, out_path, key, with_totals=False,
+                      stats=None):
+    totals = {} if with_totals else None
+    path = member_key(zip_path, member)
+    _, first, last = raw_extent(path)
+    start, end = record_span(path, span, delimiter=delimiter)
+    edges = (start == first, end == last)   # the shard before an empty last one ends the member too
+    with open_range(zip_path, start, end) as raw:
+        meter = CountingReader(raw)
+        with io.TextIOWrapper(meter, encoding="utf-8-sig", newline="") as stream:
+            out_path = clean_csv(stream, suffix_label, out_path, key, _worker_cancel, _worker_progress, totals,
+                                 meter, stats=stats, delimiter=delimiter, edges=edges)
+    return out_path, totals, stats, 0   # shards are plain "csv" only
+
+
+def plan_clean_shards(zip_path, info, workers):
+    """(byte ranges, delimiter) to clean ZIP member `info` as shards, or None to clean it whole.
+    Only members stored without compression can be split (see `plan_shards`). The delimiter is
+    sniffed from the start of the member, as `clean_csv` would. The member must hold 3 records
+    or more, so that its header and trailer, which may end up in different shards, are dropped
+    as they would be from the whole file."""
+    if workers < 2 or info.compress_type != zipfile.ZIP_STORED or info.file_size < SHARD_MIN_BYTES:
+        return None
+    spans = plan_shards(member_key(zip_path, info.filename), workers)
+    if not spans:
+        return None
+    with io.TextIOWrapper(open_range(zip_path, spans[0][0], spans[-1][1]), encoding="utf-8-sig", newline="") as f:
+        delimiter = sniff_delimiter(f)
+        if len(list(islice(csv.reader(f, delimiter=delimiter), 3))) < 3:
+            return None
+    return spans, delimiter
+
+
+class _Shards:
+    """Stands in for the future of a ZIP member cleaned as byte-range shards. `result()` waits
+    for them, joins their outputs in order into `part_path` and adds up their totals and
+    stats, returning what `_clean_member_task` does."""
+
+    def __init__(self, executor, zip_path, member, spans, delimiter, suffix_label, part_path, with_totals=False,
+                 stats=None):
+        self.key = member_key(zip_path, member)
+        self.keys = [shard_key(self.key, i) for i in range(1, len(spans) + 1)]
+        self.part_path = part_path
+        self.stats = stats
+        self.futures = [executor.submit(_clean_shard_task, zip_path, member, span, delimiter, suffix_label,
+                                        f"{part_path}.{i + 1}", key, with_totals,
+                                        stats and stats.child())
+                        for i, (span, key) in enumerate(zip(spans, self.keys))]
+
+    def result(self):
+        try:
+            results = [future.result() for future in self.futures]
+        except BaseException:
+            for future in self.futures:
+                future.cancel()
+            raise
+        join_parts([out_path for out_path, _, _, _ in results], self.part_path, b"")
+        totals = None
+        if results[0][1] is not None:
+            totals = {"input": ColumnTotals(), "output": ColumnTotals()}
+            for _, part_totals, _, _ in results:
+                for name, acc in totals.items():
+                    acc.merge(part_totals[name])
+        if self.stats is not None:
+            for _, _, part_stats, _ in results:
+                self.stats.merge(part_stats, self.key)
+        return self.part_path, totals, self.stats, 0
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def make_pool(workers):
+    """Return (executor, cancel event, progress queue).
+    More than one worker uses spawned processes; a single worker runs on a thread in this process."""
+    if workers <= 1:
+        cancel, progress = threading.Event(), queue.Queue()
+        executor = ThreadPoolExecutor(1, initializer=_pool_init, initargs=(cancel, progress))
+    else:
+        ctx = mp.get_context("spawn")
+        cancel, progress = ctx.Event(), ctx.Queue()
+        executor = ProcessPoolExecutor(workers, mp_context=ctx, initializer=_pool_init, initargs=(cancel, progress))
+    return executor, cancel, progress
+
+
+def _submit_clean_jobs(executor, zip_paths, output_dir, stream, cancel, with_totals, checkpoints=False, fmt="csv",
+                       level=None, stats=None, workers=1):
+    """Queue every ZIP (or, when streaming, every CSV member) on the pool. With `stats`, each
+    task gets its own `stats.child()` and returns it with its result. Large stored members
+    written as plain "csv" without checkpoints are split into `workers` shards (see `_Shards`).
+    Returns [(zip path, listing error, [(csv name, final output path, future)], [csv ZipInfo])]
+    in input order."""
+    jobs = []
+    for path in zip_paths:
+        if cancel.is_set():
+            break
+        try:
+            members = csv_members(path)
+        except Exception as e:
+            jobs.append((path, e, [], []))
+            continue
+        if not stream:
+            task = (None, None, executor.submit(_clean_extracted_task, path, output_dir, with_totals, checkpoints, fmt,
+                                               level, stats and stats.child()))
+            jobs.append((path, None, [task], members))
+            continue
+        zip_base = os.path.splitext(os.path.basename(path))[0]
+        # each member writes `<out_path>.<j>`, renamed into place once it is complete
+        tasks = []
+        for j, info in enumerate(members):
+            out_path = clean_output_path(output_dir, path, info.filename, len(members) > 1, fmt)
+            plan = plan_clean_shards(path, info, workers) if fmt == "csv" and not checkpoints else None
+            if plan is not None:
+                future = _Shards(executor, path, info.filename, *plan, zip_base, f"{out_path}.{j}", with_totals,
+                                 stats and stats.child())
+            else:
+                future = executor.submit(_clean_member_task, path, info.filename, zip_base, f"{out_path}.{j}",
+                                         with_totals, checkpoints, fmt, level, stats and stats.child())
+            tasks.append((os.path.basename(info.filename), out_path, future))
+        jobs.append((path, None, tasks, members))
+    return jobs
+
+
+def run_clean(zip_paths, output_dir, workers=None, stream=True, log=print, progress=None, cancel=None,
+              totals=False, force=False, checkpoints=False, fmt="csv", level=None, stats=None):
+    """Clean every CSV inside each ZIP into `<zip name>_processed.csv` in `output_dir`, or one
+    `<zip name>_<member>_processed.csv` per CSV when a ZIP holds several (`clean_output_path`)
+    (`.csv.gz`, `.csv.zst` or `.parquet` for the other `fmt`s, compressed at `level`).
+    ZIPs (or, when `stream` is set, individual CSV members) are spread over `workers`
+    processes (default: one per core); results are reported in input order. When streaming
+    plain "csv" without checkpoints, a member of SHARD_MIN_BYTES or more that is stored
+    without compression is split into byte ranges cleaned on several workers at once.
+    `progress(done, total, text)` counts uncompressed CSV bytes, with the compressed
+    equivalent, throughput and ETA in `text`.
+    With `totals`, the Verify Sums numbers are gathered while cleaning and written to
+    "Column Totals Summary.xlsx" alongside input-row totals, so no second pass is needed.
+    ZIPs that are unchanged since an earlier run into the same folder are skipped (see
+    `RunManifest`) unless `force` is set. With `checkpoints`, a CSV that was cancelled
+    part-way is resumed from its last `Checkpoint` instead of starting over.
+    Pass a RunStats as `stats` to get "Run Report.json/.csv" in `output_dir`."""
+    t0 = time.time()
+    progress = progress or _noop
+    cancel = cancel or threading.Event()
+    workers = workers or default_workers()
+    if totals and not have_openpyxl():
+        raise RuntimeError("openpyxl is required for Excel export. Install with: pip install openpyxl")
+    check_format(fmt, level)
+    summary = _new_summary("clean", zip_paths)
+    summary["workers"] = workers
+    done = 0
+    worker_rows = {}
+    shard_of, shard_done = {}, {}   # shard key -> member key; member key -> {shard key: (rows, bytes)}
+    zip_totals = {}   # zip path -> [(final output path, {"input": ColumnTotals, "output": ColumnTotals})]
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = RunManifest(output_dir)
+    settings = {"totals": bool(totals), "format": fmt}
+    todo = []
+    report = stats or NO_STATS
+    for path in zip_paths:
+        with report.stage(path, "manifest"):
+            entry = None if force else manifest.current("clean", path, settings)
+        if entry is None:
+            todo.append(path)
+            continue
+        summary["skipped"].append(path)
+        summary["outputs"].extend(out["path"] for out in entry["outputs"])
+        zip_totals[path] = [(outp, {k: ColumnTotals.from_state(v) for k, v in t.items()})
+                            for outp, t in entry.get("totals", {}).items()]
+        log(f"Skipped (unchanged): {os.path.basename(path)}")
+    meter = RunProgress(progress, len(zip_paths), "ZIP(s)")
+    meter.files_done = len(summary["skipped"])
+    executor, pool_cancel, pool_progress = make_pool(workers)
+    log(f"Using {workers} worker(s)")
+
+    def drain():
+        if cancel.is_set():
+            pool_cancel.set()
+        try:
+            while True:
+                pid, key, rows, nbytes = pool_progress.get_nowait()
+                worker_rows[pid] = (os.path.basename(key.rsplit("::", 1)[-1]), rows)
+                if key in shard_of:   # a shard: report the sums over the shards of its member
+                    shards = shard_done.setdefault(shard_of[key], {})
+                    shards[key] = (rows, nbytes)
+                    key = shard_of[key]
+                    rows, nbytes = (sum(n) for n in zip(*shards.values()))
+                meter.update(key, nbytes, rows)
+        except queue.Empty:
+            pass
+        if worker_rows and not cancel.is_set():
+            meter.detail = " | ".join(f"W{n}: {label} {rows:,} rows"
+                                      for n, (label, rows) in enumerate(worker_rows.values(), 1))
+            meter.report()
+
+    def result_of(future):
+        futures = future.futures if isinstance(future, _Shards) else [future]
+        while wait(futures, timeout=0.25).not_done:
+            drain()
+        drain()
+        return future.result()
+
+    jobs = []
+    try:
+        jobs = _submit_clean_jobs(executor, todo, output_dir, stream, cancel, totals, checkpoints, fmt, level, stats,
+                                  workers)
+        for path, _, tasks, members in jobs:
+            for info in members:
+                meter.add(member_key(path, info.filename), info.file_size, info.compress_size)
+            for label, _, fut in tasks:
+                if isinstance(fut, _Shards):
+                    shard_of.update(dict.fromkeys(fut.keys, fut.key))
+                    log(f"{os.path.basename(path)}::{label}: split into {len(fut.keys)} shards")
+        for path, err, tasks, members in jobs:
+            if cancel.is_set():
+                break
+            log(f"Cleaning ZIP: {os.path.basename(path)}")
+            failures = len(summary["errors"])
+            if err is not None:
+                _error(summary, log, path, err, f"ERROR processing {os.path.basename(path)}: {err}")
+            zip_outputs = {}
+            for j, (label, out_path, fut) in enumerate(tasks):
+                try:
+                    result = result_of(fut)
+                except (CancelledRun, CancelledError):
+                    break
+                except Exception as e:
+                    if label is None:
+                        _error(summary, log, path, e, f"ERROR processing {os.path.basename(path)}: {e}")
+                    else:
+                        _error(summary, log, f"{path}::{label}", e, f"ERROR cleaning {label}: {e}")
+                    continue
+                finally:
+                    if label is not None:
+                        meter.complete(member_key(path, members[j].filename))
+                if label is None:
+                    results, errors, task_stats, nulled = result
+                    for file, msg in errors:
+                        _error(summary, log, f"{path}::{file}", msg, f"ERROR cleaning {file}: {msg}")
+                else:
+                    tmp_path, member_totals, task_stats, nulled = result
+                    os.replace(tmp_path, out_path)
+                    results = [(out_path, member_totals)]
+                    nulled = {out_path: nulled}
+                report.merge(task_stats)
+                created = [outp for outp, _ in results]
+                zip_outputs.update(results)
+                summary["outputs"].extend(created)
+                for outp in created:
+                    log(f"  → Saved: {os.path.basename(outp)}")
+                for outp, n in nulled.items():
+                    _note_nulled(summary, log, outp, n)
+            zip_totals[path] = [(outp, t) for outp, t in zip_outputs.items() if t]
+            if not cancel.is_set() and len(summary["errors"]) == failures:
+                with report.stage(path, "manifest"):
+                    manifest.record("clean", path, settings, zip_outputs,
+                                    totals={os.path.abspath(outp): {k: acc.state() for k, acc in t.items()}
+                                            for outp, t in zip_totals[path]})
+            for info in members:
+                meter.complete(member_key(path, info.filename))
+            done += 1
+            meter.file_done()
+    except BaseException:
+        pool_cancel.set()  # e.g. Ctrl-C in the CLI: stop the workers too
+        raise
+    finally:
+        if cancel.is_set():
+            pool_cancel.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        # Member outputs that finished but were never renamed into place (cancel/error)
+        for _, _, tasks, _ in jobs:
+            for label, out_path, fut in tasks:
+                if label is None:
+                    continue
+                for f in fut.futures if isinstance(fut, _Shards) else [fut]:
+                    if f.done() and not f.cancelled() and f.exception() is None and os.path.exists(f.result()[0]):
+                        os.remove(f.result()[0])
+        manifest.save()
+    summary["processed"] = done
+    summary["cancelled"] = cancel.is_set()
+    summary["outputs"] = list(dict.fromkeys(summary["outputs"]))
+    if totals and not summary["cancelled"]:
+        file_totals = {}
+        for path in zip_paths:
+            file_totals.update(zip_totals.get(path, []))
+        with report.stage(RUN_KEY, "totals workbook"):
+            summary["totals"] = _write_clean_totals(file_totals, output_dir, log)
+        summary["outputs"].append(os.path.join(output_dir, SUMMARY_NAME))
+    if stats is not None:
+        summary["report"] = stats.write(output_dir, "clean")
+    summary["seconds"] = round(time.time() - t0, 3)
+    return summary
+
+
+def _write_clean_totals(file_totals, output_dir, log):
+    """Write the Verify Sums workbook for the cleaned files, plus input-vs-output columns."""
+    rows_out, totals = [], []
+    for out_path, t in file_totals.items():
+        rows, c4, c5, c6, bad = t["output"].result()
+        in_rows, in4, in5, in6, in_bad = t["input"].result()
+        name = os.path.basename(out_path)
+        rows_out.append([name, rows, c4, c5, c6, bad, in_rows, in4, in5, in6, in_rows - rows])
+        totals.append({"file": out_path, "rows": rows, "col4": c4, "col5": c5, "col6": c6, "non_numeric": bad,
+                       "input_rows": in_rows, "input_col4": in4, "input_col5": in5, "input_col6": in6,
+                       "input_non_numeric": in_bad})
+        log(f"{name} → rows={rows}, c4={c4}, c5={c5}, c6={c6} (input rows={in_rows}, c4={in4}, c5={in5}, c6={in6})")
+    write_summary_xlsx(rows_out, os.path.join(output_dir, SUMMARY_NAME), SUMMARY_HEADER + CLEAN_TOTALS_HEADER)
+    return totals
+
+
+# ------------------------------ Verify Data (sum columns 4,5,6) ------------------------------
+SUMMARY_STEM = "Column Totals Summary"
+SUMMARY_NAME = SUMMARY_STEM + ".xlsx"
+SUMMARY_FORMATS = ("xlsx", "csv", "json")   # "csv" and "json" need no openpyxl and are faster for automation
+SUMMARY_HEADER = ["File Name", "Total Rows", "Sum Col 4", "Sum Col 5", "Sum Col 6", "Non-numeric Cells"]
+CLEAN_TOTALS_HEADER = ["Input Rows", "Input Sum Col 4", "Input Sum Col 5", "Input Sum Col 6", "Dropped Rows"]
+
+
+SUM_CHUNK_ROWS = 1_000_000       # rows per pandas chunk
+
+
+def _sum_4_5_6_python(csv_path, on_progress=_noop, cancel=None, stats=NO_STATS, span=None):
+    """Pure-Python reference path (used when pandas is not installed)."""
+    acc = ColumnTotals()
+    with open_input(csv_path, span) as src, CountingReader(src) as meter, decompressed(meter, csv_path) as raw, \
+            io.TextIOWrapper(raw, encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        for rows in iter(lambda: list(islice(reader, SUM_READ_ROWS)), []):
+            acc.add_rows(rows)
+            if acc.rows % CANCEL_CHECK_ROWS == 0:
+                if cancel is not None and cancel.is_set():
+                    raise CancelledRun(csv_path)
+                on_progress(acc.rows, meter.pos)
+        stats.add(csv_path, "read", meter.seconds)
+    return acc
+
+
+def _sum_4_5_6_pandas(csv_path, on_progress=_noop, cancel=None, stats=NO_STATS, span=None):
+    """Chunked pandas path: parses only columns 4-6 and converts them to numbers in bulk.
+    `names` + `index_col=False` lets short and long rows through the C parser like csv.reader,
+    and "round_trip" parses numbers exactly as `float()` does. A column chunk holding any
+    text stays text and goes through `parse_numbers`, which counts the non-numeric cells."""
+    acc = ColumnTotals()
+    with open_input(csv_path, span) as src, CountingReader(src) as meter, decompressed(meter, csv_path) as raw:
+        reader = pd.read_csv(raw, header=None, names=range(SUM_COLUMNS[-1] + 1), usecols=SUM_COLUMNS,
+                             index_col=False, keep_default_na=False, na_values=[""], skip_blank_lines=False,
+                             float_precision="round_trip", low_memory=False, encoding="utf-8-sig",
+                             chunksize=SUM_CHUNK_ROWS)
+        with reader:
+            for chunk in reader:
+                if cancel is not None and cancel.is_set():
+                    raise CancelledRun(csv_path)
+                acc.rows += len(chunk)
+                on_progress(acc.rows, meter.pos)
+                for k, idx in enumerate(SUM_COLUMNS):
+                    col = chunk[idx].dropna()   # blank and missing cells
+                    if col.dtype.kind in "fiu":
+                        values = col.to_numpy(dtype=float)
+                        nonzero = values[values != 0]
+                        quantum = int(np.frexp(nonzero)[1].min()) - 53 if len(nonzero) else None
+                        acc.add_numbers(k, values.tolist(), quantum)
+                    elif col.dtype.kind == "b":   # only True/False: no numbers at all
+                        acc.bad += len(col)
+                    else:   # some text in this chunk: the cells go through `float()` as csv does
+                        acc.add_cells(k, col.tolist())
+        stats.add(csv_path, "read", meter.seconds)
+    return acc
+
+
+def _sum_4_5_6_parquet(path, on_progress=_noop, cancel=None):
+    """Parquet path: reads only columns 4-6. Numeric columns are summed by Arrow; text
+    columns (files not written by this tool) follow the csv rules."""
+    _require_pyarrow()
+    pf = pq.ParquetFile(path)
+    names = pf.schema_arrow.names
+    columns = [names[i] for i in SUM_COLUMNS if i < len(names)]
+    total_rows, size = pf.metadata.num_rows, os.path.getsize(path)
+    acc = ColumnTotals()
+    if not columns:
+        acc.rows = total_rows
+        return acc
+    for batch in pf.iter_batches(columns=columns):
+        if cancel is not None and cancel.is_set():
+            raise CancelledRun(path)
+        acc.rows += batch.num_rows
+        for k, col in enumerate(batch.columns):
+            if pa.types.is_integer(col.type) or pa.types.is_floating(col.type):
+                acc.add_numbers(k, pc.cast(pc.drop_null(col), pa.float64()).to_pylist())
+            else:
+                acc.add_cells(k, pc.drop_null(col).to_pylist())
+        on_progress(acc.rows, size * acc.rows // max(total_rows, 1))
+    return acc
+
+
+def sum_columns(csv_path, on_progress=_noop, cancel=None, stats=None, span=None):
+    """The ColumnTotals of `csv_path`, which can still be merged with those of its other
+    shards; with `span` (see `record_span`) only that byte range is read. See `sum_4_5_6`."""
+    stats = stats or NO_STATS
+    result = None
+    if is_parquet(csv_path):
+        result = _sum_4_5_6_parquet(csv_path, on_progress, cancel)
+    elif have_pandas():
+        try:
+            result = _sum_4_5_6_pandas(csv_path, on_progress, cancel, stats, span)
+        except pd.errors.ParserError:
+            pass  # e.g. a chunk where no row reaches column 6; the csv path copes with anything
+    return result or _sum_4_5_6_python(csv_path, on_progress, cancel, stats, span)
+
+
+def sum_4_5_6(csv_path, on_progress=_noop, cancel=None, stats=None):
+    """Row count and totals of columns 4, 5 and 6 (rounded to 2 places), plus the number of
+    non-blank cells in those columns that are not numbers. Uses pandas when it is installed;
+    `.csv.gz`/`.csv.zst` files are decompressed on the fly and `.parquet` files are read
+    column-wise with pyarrow. `csv_path` may be a ZIP member (`member_key`), read straight
+    out of the archive.
+    `on_progress(rows, bytes read)` is called every chunk (pandas) or every few thousand rows,
+    and CancelledRun is raised at the same points once `cancel` is set.
+    `stats` (a RunStats) gets the time spent reading the file as its "read" stage."""
+    return sum_columns(csv_path, on_progress, cancel, stats).result()
+
+
+class ColumnWidths:
+    """Excel column widths fitted to the longest value seen in each column, kept up to date
+    with `add(row)` as rows arrive so the cells never have to be walked again."""
+
+    def __init__(self, header=()):
+        self.max_len = []
+        self.add(header)
+
+    def add(self, row):
+        for i, value in enumerate(row):
+            n = len(str(value)) if value is not None else 0
+            if i == len(self.max_len):
+                self.max_len.append(n)
+            elif n > self.max_len[i]:
+                self.max_len[i] = n
+
+    def widths(self):
+        return [max(12, min(60, int(n * 1.2))) for n in self.max_len]
+
+
+def write_summary_xlsx(rows, out_path, header=SUMMARY_HEADER, widths=None):
+    """Write the "Summary" sheet (header + one row per file) with openpyxl's write-only mode.
+    `widths` is a ColumnWidths that has seen every row; it is worked out here when not given."""
+    if not have_openpyxl():
+        raise RuntimeError("openpyxl is required for Excel export. Install with: pip install openpyxl")
+    from openpyxl.utils import get_column_letter
+    if widths is None:
+        widths = ColumnWidths(header)
+        for row in rows:
+            widths.add(row)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Summary")
+    # a write-only sheet takes its column widths before the first row
+    for i, width in enumerate(widths.widths(), 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    wb.save(out_path)
+    return out_path
+
+
+def write_summary(rows, output_dir, header=SUMMARY_HEADER, fmt="xlsx", widths=None):
+    """Write "Column Totals Summary.<fmt>" into `output_dir` and return its path. "csv" has the
+    same header and rows as the workbook; "json" is a list of {header: value} objects."""
+    out_path = os.path.join(output_dir, f"{SUMMARY_STEM}.{fmt}")
+    if fmt == "xlsx":
+        return write_summary_xlsx(rows, out_path, header, widths)
+    if fmt == "csv":
+        with open(out_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+    elif fmt == "json":
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump([dict(zip(header, row)) for row in rows], f, indent=2)
+    else:
+        raise ValueError(f"Unknown summary format {fmt!r}; choose one of {', '.join(SUMMARY_FORMATS)}")
+    return out_path
+
+
+def summary_name(path):
+    """"File Name" of an input in the summary: its base name, or `<zip name>::<member>`."""
+    zip_path, member = split_member_key(path)
+    if member is None:
+        return os.path.basename(path)
+    return f"{os.path.basename(zip_path)}::{member}"
+
+
+def _verify_inputs(csv_paths, summary, log):
+    """[(path, size, packed size)] to verify: each .zip input is replaced by its CSV members as
+    `member_key`s (sized from the central directory, nothing is extracted). A ZIP that cannot
+    be read is an error of the run."""
+    items = []
+    for path in csv_paths:
+        if not str(path).lower().endswith(".zip"):
+            try:
+                items.append((path, os.path.getsize(path), None))
+            except OSError:
+                items.append((path, 0, None))
+            continue
+        try:
+            members = csv_members(path)
+        except Exception as e:
+            _error(summary, log, path, e, f"ERROR: {os.path.basename(path)} → {e}")
+            continue
+        items.extend((member_key(path, m.filename), m.file_size, m.compress_size) for m in members)
+    return items
+
+
+def _verify_task(path, stats=None, cancel=None, progress=None, span=None, key=None):
+    """Pool task of run_verify: sum one input, or the `span` shard of it, putting (key, rows,
+    bytes read) on the progress queue at most every REPORT_SECONDS. Process workers get
+    `cancel` and `progress` from `_pool_init`; threads are handed theirs.
+    Returns (ColumnTotals, stats)."""
+    cancel = _worker_cancel if cancel is None else cancel
+    progress = _worker_progress if progress is None else progress
+    key = key or path
+    last = [0.0]
+
+    def on_progress(rows, pos):
+        now = time.monotonic()
+        if now - last[0] >= REPORT_SECONDS:
+            last[0] = now
+            progress.put((key, rows, pos))
+
+    with (stats or NO_STATS).stage(path, "parse+sum", exclude=("read",)):
+        if span is not None:
+            span = record_span(path, span)
+        return sum_columns(path, on_progress, cancel, stats, span), stats
+
+
+def run_verify(csv_paths, output_dir, log=print, progress=None, cancel=None, force=False, stats=None,
+               summary_format="xlsx", workers=None):
+    """Sum columns 4, 5 and 6 of every CSV and save "Column Totals Summary.xlsx" in `output_dir`
+    (or ".csv"/".json" with `summary_format`, see SUMMARY_FORMATS).
+    A .zip input contributes one summary row per CSV member ("drop.zip::a.csv"), streamed out of
+    the archive.
+    Up to `workers` inputs (default: one per CPU core) are summed at once. pandas and Arrow
+    release the GIL, so with pandas installed they run on threads; the pure-Python parser runs
+    in spawned processes. When fewer inputs are left to sum than there are workers, an
+    uncompressed CSV of SHARD_MIN_BYTES or more is split into one byte range per worker (see
+    `plan_shards`) whose totals are added up. Progress counts each
+    input as soon as it finishes, and the summary rows are written in input order.
+    Totals of CSVs unchanged since an earlier run into the same folder are reused unless `force` is set.
+    Pass a RunStats as `stats` to get "Run Report.json/.csv" in `output_dir`."""
+    t0 = time.time()
+    progress = progress or _noop
+    cancel = cancel or threading.Event()
+    workers = workers or default_workers()
+    if summary_format not in SUMMARY_FORMATS:
+        raise ValueError(f"Unknown summary format {summary_format!r}; choose one of {', '.join(SUMMARY_FORMATS)}")
+    if summary_format == "xlsx" and not have_openpyxl():
+        raise RuntimeError("openpyxl is required for Excel export. Install with: pip install openpyxl")
+    summary = _new_summary("verify", csv_paths)
+    summary["totals"] = []
+    rows_out = []
+    widths = ColumnWidths(SUMMARY_HEADER)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = RunManifest(output_dir)
+    report = stats or NO_STATS
+    items = _verify_inputs(csv_paths, summary, log)
+    meter = RunProgress(progress, len(items))
+    entries = []
+    for path, size, packed in items:
+        source, member = split_member_key(path)
+        with report.stage(path, "manifest"):
+            entries.append(None if force else manifest.current("verify", source, member=member))
+    # with an input per worker there is nothing to gain from splitting one
+    shard = entries.count(None) < workers
+    plan = []
+    owner, remaining = {}, {}   # progress key -> input; input -> shards still running
+    for (path, size, packed), entry in zip(items, entries):
+        if entry is not None:
+            meter.add(path, size, packed)
+            meter.complete(path)
+            meter.files_done += 1
+            plan.append((path, size, entry, []))
+            continue
+        with report.stage(path, "shard"):
+            spans = plan_shards(path, workers) if shard else None
+        if spans:
+            log(f"{summary_name(path)}: split into {len(spans)} shards")
+            tasks = [(shard_key(path, i), span) for i, span in enumerate(spans, 1)]
+        else:
+            tasks = [(path, None)]
+        for key, span in tasks:
+            part = size if span is None else span[1] - span[0]
+            meter.add(key, part, None if packed is None else packed if span is None else part)
+            owner[key] = path
+        remaining[path] = len(tasks)
+        plan.append((path, size, entry, tasks))
+    todo = len(owner)
+    n = max(1, min(workers, todo))
+    processes = n > 1 and not have_pandas()
+    if processes:
+        executor, pool_cancel, pool_progress = make_pool(n)
+        handed = ()
+    else:
+        # not make_pool: its initializer would swap the worker globals of a clean run on a thread
+        executor, pool_cancel, pool_progress = ThreadPoolExecutor(n), threading.Event(), queue.Queue()
+        handed = (pool_cancel, pool_progress)
+    if todo:
+        log(f"Using {n} worker(s) ({'processes' if processes else 'threads'})")
+    finished = queue.Queue()   # done callbacks run on pool threads; `meter` is only touched here
+
+    def drain():
+        if cancel.is_set():
+            pool_cancel.set()
+        try:
+            while True:
+                path, rows, nbytes = pool_progress.get_nowait()
+                meter.update(path, nbytes, rows)
+        except queue.Empty:
+            pass
+        try:
+            while True:
+                key = finished.get_nowait()
+                meter.complete(key)
+                remaining[owner[key]] -= 1
+                if not remaining[owner[key]]:
+                    meter.file_done()
+        except queue.Empty:
+            pass
+
+    def result_of(future):
+        while not wait([future], timeout=0.25).done:
+            drain()
+        drain()
+        return future.result()
+
+    jobs = []
+    for path, size, entry, tasks in plan:
+        futures = []
+        for key, span in tasks:
+            future = executor.submit(_verify_task, path, report.child(), *handed, span=span, key=key)
+            future.add_done_callback(lambda _, key=key: finished.put(key))
+            futures.append(future)
+        jobs.append((path, size, entry, futures))
+    try:
+        for path, size, entry, futures in jobs:
+            if cancel.is_set():
+                break
+            name = summary_name(path)
+            try:
+                if entry is not None:
+                    rows, c4, c5, c6, bad = entry["result"]
+                    summary["skipped"].append(path)
+                else:
+                    acc = ColumnTotals()
+                    for part, task_stats in map(result_of, futures):
+                        acc.merge(part)
+                        report.merge(task_stats)
+                    rows, c4, c5, c6, bad = acc.result()
+                    report.count(path, rows_in=rows, bytes_read=size)
+                    source, member = split_member_key(path)
+                    with report.stage(path, "manifest"):
+                        manifest.record("verify", source, member=member, result=[rows, c4, c5, c6, bad])
+                    summary["processed"] += 1
+                rows_out.append([name, rows, c4, c5, c6, bad])
+                widths.add(rows_out[-1])
+                summary["totals"].append({"file": path, "rows": rows, "col4": c4, "col5": c5, "col6": c6,
+                                          "non_numeric": bad})
+                msg = f"{name} → rows={rows}, c4={c4}, c5={c5}, c6={c6}"
+                msg += f", non-numeric cells={bad}" if bad else ""
+                log(msg + (" (unchanged)" if entry is not None else ""))
+            except (CancelledRun, CancelledError):
+                log(f"Cancelled: {name}")
+                break
+            except Exception as e:
+                _error(summary, log, path, e, f"ERROR: {name} → {e}")
+        drain()
+    except BaseException:
+        pool_cancel.set()  # e.g. Ctrl-C in the CLI: stop the workers too
+        raise
+    finally:
+        if cancel.is_set():
+            pool_cancel.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+    manifest.save()
+    with report.stage(RUN_KEY, "write summary"):
+        out_path = write_summary(rows_out, output_dir, fmt=summary_format, widths=widths)
+    summary["outputs"].append(out_path)
+    summary["cancelled"] = cancel.is_set()
+    if stats is not None:
+        summary["report"] = stats.write(output_dir, "verify")
+    summary["seconds"] = round(time.time() - t0, 3)
+    return summary
+
+
+# ------------------------------ Validate Data (CSV + Excel match) ------------------------------
+def normalize_file_name(name):
+    """Key used to match a CSV file name against the mapping's 'File Name' column:
+    lower case, no whitespace, 'sales_' spelled 'sale_'."""
+    return re.sub(r"\s+", "", str(name).strip().lower()).replace('sales_', 'sale_')
+
+
+MAPPING_CACHE_MAX_BYTES = 256 * 1024 * 1024   # evict least recently used entries beyond this
+
+
+def mapping_cache_dir():
+    """Folder for parsed-mapping cache files ($IQVIA_CACHE_DIR overrides the default)."""
+    if os.environ.get("IQVIA_CACHE_DIR"):
+        return os.environ["IQVIA_CACHE_DIR"]
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        return os.path.join(base, "IQVIA Data", "cache")
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "iqvia")
+
+
+def _mapping_cache_path(excel_path):
+    st = os.stat(excel_path)
+    key = f"{os.path.abspath(excel_path)}|{st.st_size}|{st.st_mtime_ns}|{file_sha256(excel_path)}"
+    return os.path.join(mapping_cache_dir(), hashlib.sha256(key.encode("utf-8")).hexdigest() + ".pkl")
+
+
+def _evict_mapping_cache(folder, max_bytes=MAPPING_CACHE_MAX_BYTES):
+    """Delete the least recently used cache files until the folder is under `max_bytes`."""
+    entries = []
+    for name in os.listdir(folder):
+        if name.endswith(".pkl"):
+            st = os.stat(os.path.join(folder, name))
+            entries.append((st.st_mtime, st.st_size, os.path.join(folder, name)))
+    used = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if used <= max_bytes:
+            break
+        os.remove(path)
+        used -= size
+
+
+def _read_mapping(excel_path):
+    """Parse the workbook into (lookup, duplicates); see `load_mapping`."""
+    if not have_pandas():
+        raise RuntimeError("pandas is required. Install with: pip install pandas openpyxl")
+    df = pd.read_excel(excel_path, engine='openpyxl')
+    lookup, duplicates = {}, {}
+    for name, value in zip(df['File Name'].astype(str), df['Add in File']):
+        key = normalize_file_name(name)
+        if key in lookup:
+            duplicates.setdefault(key, [lookup[key]]).append(value)
+        else:
+            lookup[key] = value
+    return lookup, duplicates
+
+
+def load_mapping(excel_path, use_cache=True, rebuild=False, log=_noop):
+    """Read the mapping workbook ('File Name', 'Add in File') into a normalized-name -> value dict.
+    Returns (lookup, duplicates); when a name appears on several rows the first row's value is
+    used, and `duplicates` maps that name to every value it was given.
+
+    The parsed result is cached on disk, keyed on the workbook's path, size, mtime and content
+    hash, so an unchanged workbook is not parsed again. `rebuild` ignores any cached copy."""
+    if not use_cache:
+        return _read_mapping(excel_path)
+    cache_path = _mapping_cache_path(excel_path)
+    if not rebuild and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                mapping = pickle.load(f)
+            os.utime(cache_path)  # mark as recently used for eviction
+            log(f"Excel mapping loaded from cache ({len(mapping[0])} names)")
+            return mapping
+        except Exception:
+            pass  # unreadable or stale format: parse the workbook again
+    mapping = _read_mapping(excel_path)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path + ".part", "wb") as f:
+            pickle.dump(mapping, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_path + ".part", cache_path)
+        _evict_mapping_cache(os.path.dirname(cache_path))
+    except OSError as e:
+        log(f"WARNING: could not write mapping cache: {e}")
+    log(f"Excel mapping parsed ({len(mapping[0])} names)")
+    return mapping
+
+
+def find_match_value(lookup, csv_filename):
+    """The 'Add in File' value for `csv_filename`, or None when the mapping has no row for it."""
+    return lookup.get(normalize_file_name(os.path.basename(csv_filename)))
+
+
+VALIDATED_FIELDS = 10   # cols 1-6, the number, 0, 0 and the first word of col 3
+
+
+def validated_lines(lines, number_from_excel):
+    """Rewrite each line with >= 7 fields as `cols 1-6, <number>, 0, 0, <first word of col 3>`;
+    shorter lines are dropped and lines whose col 3 is blank are copied through unchanged."""
+    for line in lines:
+        parts = line.split(',')
+        if len(parts) >= 7:
+            try:
+                third_col_value = parts[2].strip().split()[0]
+                yield f"{','.join(parts[:6])},{number_from_excel},0,0,{third_col_value}"
+            except Exception:
+                yield line
+
+
+# Bytes that str.splitlines/str.split treat as line breaks or whitespace and the bytes
+# methods do not; a block holding any of them (or non-ASCII) is transformed as text
+_TEXT_ONLY_BREAKS = (b"\x0b", b"\x0c", b"\x1c", b"\x1d", b"\x1e", b"\x1f")
+MAP_BLOCK_BYTES = 4 * 1024 * 1024   # bytes of the mapped input transformed per step
+
+
+def validated_block(block, number_from_excel):
+    """`validated_lines` over `block`, whole lines of an input as bytes. Returns (output
+    lines as bytes, number of lines in).
+    A pure-ASCII block is split and joined as bytes, without decoding: bytes.splitlines
+    breaks on \n, \r\n and \r like text mode, and the fields are the same bytes. Each line
+    costs one split and one join: the split's 7th item (col 7 onwards) is swapped for
+    `<number>,0,0,<first word of col 3>`. Other blocks are decoded and go through
+    `validated_lines`; a block ends at a line break, so decoding it alone gives the same
+    text as decoding the whole file."""
+    if block.isascii() and not any(b in block for b in _TEXT_ONLY_BREAKS):
+        lines = block.splitlines()
+        tail = f"{number_from_excel},0,0,".encode("utf-8")
+        out = []
+        append = out.append
+        for line in lines:
+            parts = line.split(b",", 6)
+            try:
+                parts[6] = tail + parts[2].split(None, 1)[0]
+            except IndexError:   # under 7 fields (dropped) or a blank col 3 (copied)
+                if len(parts) == 7:
+                    append(line)
+                continue
+            append(b",".join(parts))
+        return out, len(lines)
+    lines = block.decode("utf-8", errors="ignore").splitlines()
+    return [line.encode("utf-8") for line in validated_lines(lines, number_from_excel)], len(lines)
+
+
+def _validated_blocks(mm, pos, end, number_from_excel, cancel=None, stats=NO_STATS, csv_path=None):
+    """Run `validated_block` over `mm[pos:end]` about MAP_BLOCK_BYTES at a time, each block cut
+    after a line break. Yields (output lines, lines in, offset the block ends at)."""
+    while pos < end:
+        if cancel is not None and cancel.is_set():
+            raise CancelledRun(csv_path)
+        stop = min(pos + MAP_BLOCK_BYTES, end)
+        if stop < end:
+            nl = mm.rfind(b"\n", pos, stop)
+            if nl < 0:   # \r line ends; never the last byte, which may start a \r\n
+                nl = mm.rfind(b"\r", pos, stop - 1)
+            stop = nl + 1 if nl >= 0 else mm.find(b"\n", stop, end) + 1 or end
+        t0 = time.perf_counter()
+        block = mm[pos:stop]
+        stats.add(csv_path, "read", time.perf_counter() - t0)
+        yield validated_block(block, number_from_excel) + (stop,)
+        pos = stop
+
+
+def validated_path(csv_path, output_dir, fmt="csv"):
+    """Where `process_single_csv` writes the output of `csv_path`."""
+    return os.path.join(output_dir, f"processed_{os.path.splitext(os.path.basename(csv_path))[0]}{OUTPUT_FORMATS[fmt]}")
+
+
+def process_single_csv(csv_path, number_from_excel, output_dir, on_progress=_noop, cancel=None,
+                       checkpoints=False, fmt="csv", level=None, stats=None, span=None, out_path=None,
+                       counts=None):
+    """Transform one CSV with `validated_lines`. Lines are joined with newlines (os.linesep)
+    and the file has no trailing newline. The input is memory-mapped and transformed as
+    bytes, MAP_BLOCK_BYTES at a time (`validated_block`), whatever the output format.
+    `on_progress(lines written, bytes read)` is called after every block, and CancelledRun
+    is raised before the next one once `cancel` is set. With `checkpoints`, each block is
+    committed once written (see `Checkpoint`): a cancelled file keeps its partial output
+    and the next call resumes it from the block after. `fmt` picks the output format (see
+    OUTPUT_FORMATS) and `level` the compression level; "parquet" writes the comma-separated
+    fields with `ParquetRowWriter`. Checkpoints apply to plain "csv" only. Pass a dict as
+    `counts` to get `counts["nulled"]`, the non-numeric cells of columns 4-6 that Parquet
+    stored as null. `stats` (a RunStats) gets the read, transform and write times and the
+    line and byte counts of this file. With `span` (start, end) only those bytes of the file
+    are read (a shard, see `record_span`); `out_path` overrides the output path.
+    Returns the output path."""
+    stats = stats or NO_STATS
+    out_path = out_path or validated_path(csv_path, output_dir, fmt)
+    tmp_path = out_path + ".part"
+    resumable = checkpoints and fmt == "csv"
+    ckpt = Checkpoint(out_path, source_id(csv_path, value=str(number_from_excel))) if resumable else None
+    lines_in, state = ckpt.load() if ckpt is not None else (0, None)
+    if state is not None and "at" not in state:   # saved by a version that counted lines only
+        lines_in, state = 0, None
+    lines_out = state["written"] if state else 0
+    linesep = os.linesep.encode()
+    try:
+        with open(csv_path, "rb") as f:
+            start, end = span or (0, os.fstat(f.fileno()).st_size)
+            pos = state["at"] if state else start
+            if fmt == "parquet":
+                # lines with a blank col 3 are copied as they are, so widths vary
+                out = ParquetRowWriter(tmp_path, width=VALIDATED_FIELDS)
+                if stats.enabled:
+                    out._flush = stats.timed(out._flush, csv_path, "write")
+            else:
+                out = open_csv_output(tmp_path, fmt, level, append=state is not None, buffering=IO_BUFFER)
+                dst = out.buffer
+                write = stats.timed(dst.write, csv_path, "write") if stats.enabled else dst.write
+                sep = linesep if state and state["bytes"] else b""
+            with out, stats.stage(csv_path, "transform", exclude=("read", "write")), \
+                    (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if end > pos else nullcontext()) as mm:
+                for lines, n_in, pos in _validated_blocks(mm, pos, end, number_from_excel, cancel, stats, csv_path):
+                    if fmt == "parquet":
+                        out.writerows(line.decode("utf-8").split(",") for line in lines)
+                    elif lines:
+                        write(sep)
+                        write(linesep.join(lines))
+                        sep = linesep
+                    lines_in += n_in
+                    lines_out += len(lines)
+                    if ckpt is not None:
+                        dst.flush()
+                        ckpt.save(lines_in, dst.tell(), at=pos, written=lines_out)
+                    on_progress(lines_out, pos - start)
+        if fmt == "parquet" and counts is not None:
+            counts["nulled"] = out.nulled
+        if stats.enabled:
+            stats.count(csv_path, rows_in=lines_in, rows_out=lines_out, bytes_read=end - start,
+                        bytes_written=os.path.getsize(tmp_path))
+        os.replace(tmp_path, out_path)
+    except BaseException as e:
+        _discard_partial(tmp_path, ckpt, keep=isinstance(e, (CancelledRun, KeyboardInterrupt)))
+        raise
+    if ckpt is not None:
+        ckpt.clear()
+    return out_path
+
+
+def _validate_shard_task(csv_path, number_from_excel, span, part_path, key, stats=None):
+    """Pool task of run_validate: transform the `span` shard of `csv_path` into `part_path`,
+    putting (key, lines written, bytes read) on the progress queue at most every REPORT_SECONDS.
+    Returns (part_path, stats)."""
+    last = [0.0]
+
+    def on_progress(n, pos):
+        now = time.monotonic()
+        if now - last[0] >= REPORT_SECONDS:
+            last[0] = now
+            _worker_progress.put((key, n, pos))
+
+    span = record_span(csv_path, span, quoted=False)   # lines, not records
+    process_single_csv(csv_path, number_from_excel, None, on_progress, _worker_cancel, stats=stats, span=span,
+                       out_path=part_path)
+    return part_path, stats
+
+
+def _validate_sharded(pool, csv_path, number_from_excel, output_dir, spans, meter, cancel, stats=NO_STATS):
+    """Transform `csv_path` as one pool task per byte range in `spans` and join the outputs.
+    Plain CSV output only: text mode writes each "\n" as os.linesep, so the parts are joined
+    with that. Returns the output path."""
+    executor, pool_cancel, pool_progress = pool
+    out_path = validated_path(csv_path, output_dir)
+    tmp_path = out_path + ".part"
+    keys = [shard_key(csv_path, i) for i in range(1, len(spans) + 1)]
+    parts = [f"{out_path}.{i}" for i in range(1, len(spans) + 1)]
+    futures = [executor.submit(_validate_shard_task, csv_path, number_from_excel, span, part, key, stats.child())
+               for span, part, key in zip(spans, parts, keys)]
+    shards = {}   # key -> (lines written, bytes read)
+    try:
+        while wait(futures, timeout=0.25).not_done:
+            if cancel.is_set():
+                pool_cancel.set()
+            try:
+                while True:
+                    key, n, pos = pool_progress.get_nowait()
+                    if key in keys:
+                        shards[key] = (n, pos)
+                        meter.update(csv_path, sum(p for _, p in shards.values()),
+                                     sum(r for r, _ in shards.values()))
+            except queue.Empty:
+                pass
+        for future in futures:
+            stats.merge(future.result()[1])
+        with stats.stage(csv_path, "join shards"):
+            join_parts(parts, tmp_path, os.linesep.encode())
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        pool_cancel.set()   # stop the other shards of this file
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        if not cancel.is_set():
+            pool_cancel.clear()
+        for path in parts + [tmp_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    return out_path
+
+
+def run_validate(csv_paths, excel_path, output_dir, log=print, progress=None, cancel=None, mapping=None,
+                 rebuild_cache=False, force=False, checkpoints=False, fmt="csv", level=None, stats=None,
+                 workers=None):
+    """Transform every CSV using its 'Add in File' value from the Excel mapping.
+    Pass the result of `load_mapping` as `mapping` to skip reading `excel_path`.
+    CSVs whose content and mapping value are unchanged since an earlier run into the same
+    folder, and whose output is still there, are skipped unless `force` is set.
+    `checkpoints` lets a file cancelled part-way resume on the next run.
+    `fmt` is one of OUTPUT_FORMATS and `level` the compression level of "csv.gz"/"csv.zst".
+    Files are transformed one after another; with plain "csv" output and no `checkpoints`, a
+    CSV of SHARD_MIN_BYTES or more is split into byte ranges transformed on up to `workers`
+    processes (default: one per CPU core) and joined in order.
+    Pass a RunStats as `stats` to get "Run Report.json/.csv" in `output_dir`."""
+    t0 = time.time()
+    progress = progress or _noop
+    cancel = cancel or threading.Event()
+    check_format(fmt, level)
+    workers = workers or default_workers()
+    report = stats or NO_STATS
+    shardable = fmt == "csv" and not checkpoints
+    pool = None
+    with report.stage(RUN_KEY, "load mapping"):
+        lookup, duplicates = mapping or load_mapping(excel_path, rebuild=rebuild_cache, log=log)
+    summary = _new_summary("validate", csv_paths)
+    summary["unmatched"] = []
+    summary["duplicate_names"] = {key: [str(v) for v in values] for key, values in duplicates.items()}
+    for key, values in duplicates.items():
+        log(f"WARNING: '{key}' appears {len(values)} times in the Excel mapping "
+            f"({', '.join(map(str, values))}); using {values[0]}")
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = RunManifest(output_dir)
+    meter = _file_progress(progress, csv_paths)
+    for csv_path in csv_paths:
+        if cancel.is_set():
+            break
+        try:
+            with report.stage(csv_path, "match"):
+                number_from_excel = find_match_value(lookup, csv_path)
+            settings = {"value": str(number_from_excel), "format": fmt}
+            entry = None
+            if number_from_excel is not None and not force:
+                with report.stage(csv_path, "manifest"):
+                    entry = manifest.current("validate", csv_path, settings)
+            if number_from_excel is None:
+                summary["unmatched"].append(csv_path)
+                log(f"No match in Excel for: {os.path.basename(csv_path)}")
+            elif entry is not None:
+                summary["outputs"].append(entry["outputs"][0]["path"])
+                summary["skipped"].append(csv_path)
+                log(f"Skipped (unchanged): {os.path.basename(csv_path)}")
+            else:
+                try:
+                    spans = None
+                    if shardable:
+                        with report.stage(csv_path, "shard"):
+                            spans = plan_shards(csv_path, workers)
+                    if spans:
+                        log(f"{os.path.basename(csv_path)}: split into {len(spans)} shards")
+                        pool = pool or make_pool(workers)
+                        out_path = _validate_sharded(pool, csv_path, number_from_excel, output_dir, spans, meter,
+                                                     cancel, report)
+                    else:
+                        counts = {}
+                        out_path = process_single_csv(csv_path, number_from_excel, output_dir,
+                                                      lambda n, pos: meter.update(csv_path, pos, n), cancel,
+                                                      checkpoints, fmt, level, stats, counts=counts)
+                    with report.stage(csv_path, "manifest"):
+                        manifest.record("validate", csv_path, settings, [out_path])
+                    summary["outputs"].append(out_path)
+                    summary["processed"] += 1
+                    log(f"Created: {os.path.basename(out_path)}")
+                    if not spans:
+                        _note_nulled(summary, log, out_path, counts.get("nulled", 0))
+                except CancelledRun:
+                    raise
+                except Exception as e:
+                    _error(summary, log, csv_path, e, f"Error {os.path.basename(csv_path)}: {e}")
+        except CancelledRun:
+            log(f"Cancelled: {os.path.basename(csv_path)}")
+            break
+        except Exception as e:
+            _error(summary, log, csv_path, e, f"ERROR {os.path.basename(csv_path)}: {e}")
+        meter.complete(csv_path)
+        meter.file_done()
+    if pool is not None:
+        pool[0].shutdown(wait=True, cancel_futures=True)
+    manifest.save()
+    summary["cancelled"] = cancel.is_set()
+    if stats is not None:
+        summary["report"] = stats.write(output_dir, "validate")
+    summary["seconds"] = round(time.time() - t0, 3)
+    return summary
+
+
+# ------------------------------ Master SKU's ------------------------------
+NEW_SKU_NAME = "Logic1_New_SKU.csv"
+UNIQUE_CORPORATE_NAME = "Unique_Corporate_List.csv"
+
+
+SKU_COLUMN = 3                   # 0-based position of the SKU column (column 4)
+COLUMN_CHUNK_ROWS = 500_000      # rows per chunk when reading a single column
+
+
+def read_column(path, col, chunk_rows=COLUMN_CHUNK_ROWS):
+    """Yield column `col` (0-based) of a CSV with a header row as Series of strings, one chunk at
+    a time. Only that column is parsed and nothing is type-converted; blank cells are "".
+    `.csv.gz`/`.csv.zst` files are decompressed on the fly. For a `.parquet` file only that
+    column is read, every row is data, and numbers in the float columns come back as Python
+    writes them ("3.0"); nulls are ""."""
+    if not have_pandas():
+        raise RuntimeError("pandas is required. Install with: pip install pandas")
+    if is_parquet(path):
+        _require_pyarrow()
+        pf = pq.ParquetFile(path)
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=[pf.schema_arrow.names[col]]):
+            column = batch.column(0)
+            if pa.types.is_floating(column.type):
+                yield pd.Series(["" if v is None else str(v) for v in column.to_pylist()], dtype=object)
+            else:
+                yield column.cast(pa.string()).to_pandas().fillna("")
+        return
+    with pd.read_csv(path, usecols=[col], dtype=str, keep_default_na=False, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield chunk.iloc[:, 0]
+
+
+def find_new_sku(files, out_file, log=_noop, stats=None):
+    """Write the distinct 4th-column values of files[0] that appear in none of the master files
+    files[1:], in first-seen order. Returns the count.
+    Values are compared as text. The masters are read into a set and files[0] is streamed
+    against it, so memory follows the number of distinct SKUs rather than the file sizes.
+    Pass a RunStats as `stats` to get "Run Report.json/.csv" next to `out_file`."""
+    if len(files) < 2:
+        raise ValueError("at least 2 CSV files are required (the new file, then one or more master files)")
+    report = stats or NO_STATS
+    masters = set()
+    for path in files[1:]:
+        rows = 0
+        with report.stage(path, "read masters"):
+            for values in read_column(path, SKU_COLUMN):
+                masters.update(values)
+                rows += len(values)
+        report.count(path, rows_in=rows, bytes_read=os.path.getsize(path))
+        log(f"Master {os.path.basename(path)}: {len(masters):,} distinct SKUs so far")
+
+    tmp_path = out_file + ".part"
+    seen = set()
+    rows = 0
+    try:
+        with report.stage(files[0], "compare+write"):
+            with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.writer(f, lineterminator=os.linesep)
+                writer.writerow(["NotFound_Values"])
+                for values in read_column(files[0], SKU_COLUMN):
+                    rows += len(values)
+                    for value in values:
+                        if value not in masters and value not in seen:
+                            seen.add(value)
+                            writer.writerow([value])
+        report.count(files[0], rows_in=rows, rows_out=len(seen), bytes_read=os.path.getsize(files[0]),
+                     bytes_written=os.path.getsize(tmp_path))
+        os.replace(tmp_path, out_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    log(f"{os.path.basename(files[0])}: {len(seen):,} SKU(s) not found in {len(files) - 1} master file(s)")
+    if stats is not None:
+        stats.write(os.path.dirname(os.path.abspath(out_file)), "new-sku")
+    return len(seen)
+
+
+CORPORATE_COLUMN = 0             # 0-based position of the corporate name column
+
+
+def _count_column(path, col, stats=NO_STATS):
+    """Occurrences of each value of column `col` in one CSV, in first-seen order."""
+    counts = Counter()
+    with stats.stage(path, "read+count"):
+        for values in read_column(path, col):
+            counts.update(values.tolist())
+    stats.count(path, rows_in=sum(counts.values()), bytes_read=os.path.getsize(path))
+    return counts
+
+
+def unique_corporate_list(files, out_file, log=_noop, workers=None, stats=None):
+    """Write the distinct 1st-column values of all `files`, in first-seen order, with the number
+    of times each occurs. Returns the number of distinct values.
+    Each file's column is read as text, in chunks, on its own thread (up to `workers`);
+    the per-file counts are then merged in file order in a single pass.
+    Pass a RunStats as `stats` to get "Run Report.json/.csv" next to `out_file` (with several
+    threads, per-stage memory peaks overlap)."""
+    report = stats or NO_STATS
+    totals = Counter()
+    workers = max(1, min(len(files), workers or default_workers()))
+    with ThreadPoolExecutor(workers) as pool:
+        for path, counts in zip(files, pool.map(lambda p: _count_column(p, CORPORATE_COLUMN, report), files)):
+            with report.stage(RUN_KEY, "merge"):
+                totals.update(counts)
+            log(f"{os.path.basename(path)}: {len(counts):,} distinct value(s)")
+
+    tmp_path = out_file + ".part"
+    try:
+        with report.stage(RUN_KEY, "write"):
+            with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.writer(f, lineterminator=os.linesep)
+                writer.writerow(["Unique_Values", "Count"])
+                writer.writerows(totals.items())
+        report.count(RUN_KEY, rows_out=len(totals), bytes_written=os.path.getsize(tmp_path))
+        os.replace(tmp_path, out_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    log(f"{len(totals):,} distinct value(s) across {len(files)} file(s)")
+    if stats is not None:
+        stats.write(os.path.dirname(os.path.abspath(out_file)), "unique-corporate")
+    return len(totals)
@@ -0,0 +1,354 @@
+"""Regression checks for the IQVIA Data engines, on small files written on the fly.
+
+    python iqvia_selftest.py
+    python iqvia_selftest.py --only parquet-validate
+
+Each check compares two ways of getting the same result (for example Parquet against CSV
+output, or a sharded run against a whole-file run) and prints ok, FAIL or skipped (when an
+optional dependency is missing). The exit code is 1 when any check failed.
+"""
+import os
+import io
+import csv
+import sys
+import math
+import random
+import zipfile
+import argparse
+import tempfile
+import traceback
+import threading
+
+import iqvia_core as core
+
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _noop(*_):
+    pass
+
+
+def _folder(tmp, name):
+    path = os.path.join(tmp, name)
+    os.makedirs(path)
+    return path
+
+
+def _quoted_csv(rng, rows, newline="\r\n"):
+    """A CSV with quoted fields holding delimiters, quotes and line breaks, empty quoted
+    fields and numbers in columns 4-6, between a header and a trailer line."""
+    texts = ["plain", "", '""', '"a,b"', '"say ""hi"""', '"two\nlines"', '"x\r\ny, ""z"""', '","', '"\n"']
+    lines = ["h1,h2,h3,h4,h5,h6,h7"]
+    for n in range(rows):
+        lines.append(",".join([rng.choice(texts), f"id{n}", rng.choice(texts), str(n % 97),
+                               f"{rng.uniform(0, 100):.2f}", rng.choice(["1", "2.5", ""]), rng.choice(texts)]))
+    lines.append("TRAILER")
+    return newline.join(lines).encode()
+
+
+class _Sharded:
+    """Makes every input big enough to be split while the `with` block runs."""
+
+    def __enter__(self):
+        self.saved, core.SHARD_MIN_BYTES = core.SHARD_MIN_BYTES, 1
+
+    def __exit__(self, *exc):
+        core.SHARD_MIN_BYTES = self.saved
+
+
+class Skip(Exception):
+    pass
+
+
+def check_parquet_validate(tmp):
+    """Validate writes the same rows as CSV and as Parquet, including a line copied through
+    unchanged (blank col 3) that is narrower, and one that is wider, than the others."""
+    if not core.have_pyarrow():
+        raise Skip("needs pyarrow")
+    src = _write(os.path.join(tmp, "ragged.csv"),
+                 b"a,b,c d,1,2,3,4,5,6\r\nx,y,,1,2,3,4\r\nshort,line\r\np,q,,1,2,3,4,5,6,7,8,9\r\ne,f,g,4,5,6,7")
+    out_csv = core.process_single_csv(src, 42, _folder(tmp, "csv"), fmt="csv")
+    out_pq = core.process_single_csv(src, 42, _folder(tmp, "parquet"), fmt="parquet")
+    with open(out_csv, encoding="utf-8", newline="") as f:
+        expected = [line.split(",") for line in f.read().split(os.linesep)]
+    got = core.pq.read_table(out_pq).to_pylist()
+    assert len(got) == len(expected), f"{len(got)} Parquet rows, {len(expected)} CSV lines"
+    width = core.VALIDATED_FIELDS
+    for n, (row, fields) in enumerate(zip(got, expected), 1):
+        fields = fields[:width - 1] + [",".join(fields[width - 1:])] if len(fields) > width else fields
+        fields = fields + [None] * (width - len(fields))
+        cells = list(row.values())
+        want = [core._to_float(v) if i in core.SUM_COLUMNS else v for i, v in enumerate(fields)]
+        assert cells == want, f"row {n}: {cells} != {want}"
+
+
+def check_clean_members(tmp):
+    """Each CSV of a multi-member ZIP is cleaned into its own file, the same whether the
+    members are streamed or extracted first, and each output is listed once."""
+    rng = random.Random(1)
+    members = {"East.csv": _quoted_csv(rng, 50), "sub/West.csv": _quoted_csv(rng, 60), "notes.txt": b"skip me"}
+    archive = os.path.join(tmp, "drop.zip")
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    names = ["drop_East_processed.csv", "drop_sub_West_processed.csv"]
+    results = []
+    for stream in (True, False):
+        out = _folder(tmp, f"stream-{stream}")
+        summary = core.run_clean([archive], out, workers=1, stream=stream, log=_noop)
+        assert not summary["errors"], summary["errors"]
+        assert summary["outputs"] == [os.path.join(out, name) for name in names], summary["outputs"]
+        files = []
+        for path in summary["outputs"]:
+            with open(path, "rb") as f:
+                files.append(f.read())
+        results.append(files)
+    assert results[0] == results[1], "streamed and extracted members differ"
+    assert results[0][0] != results[0][1], "both outputs hold the same member"
+
+
+def check_parquet_outputs(tmp):
+    """Clean pads and folds ragged rows into Parquet like Validate does, both count the
+    non-numeric cells of columns 4-6 that Parquet stores as null, and an output with no rows
+    still has its columns, so Verify can read it back."""
+    if not core.have_pyarrow():
+        raise Skip("needs pyarrow")
+    rows = _write(os.path.join(tmp, "rows.csv"),
+                  b"h1,h2,h3,h4,h5,h6,h7\r\na,b,c d,1,2,3,4\r\nd,e,f,n/a,5\r\ng,h,i,7,8,9,10,11\r\nTRAILER")
+    archives = []
+    for name, data in (("rows", rows), ("empty", None)):
+        archives.append(os.path.join(tmp, f"{name}.zip"))
+        with zipfile.ZipFile(archives[-1], "w") as z:
+            if data is None:
+                z.writestr(f"{name}.csv", b"")
+            else:
+                z.write(data, f"{name}.csv")
+    out = _folder(tmp, "out")
+    clean = core.run_clean(archives, out, workers=1, fmt="parquet", log=_noop)
+    assert not clean["errors"], clean["errors"]
+    cleaned = os.path.join(out, "rows_processed.parquet")
+    # "n/a", and the label of the short row, which lands in column 6
+    assert clean["nulled_cells"] == {cleaned: 2}, clean.get("nulled_cells")
+    got = [list(row.values()) for row in core.pq.read_table(cleaned).to_pylist()]
+    assert got == [["a", "b", "c d", 1.0, 2.0, 3.0, "4", "rows"], ["d", "e", "f", None, 5.0, None, None, None],
+                   ["g", "h", "i", 7.0, 8.0, 9.0, "10", "11,rows"]], got
+    validate = core.run_validate([rows], None, out, log=_noop, fmt="parquet",
+                                 mapping=({core.normalize_file_name("rows.csv"): 42}, {}))
+    assert not validate["errors"], validate["errors"]
+    # the header line has 7 fields, so it is transformed too
+    assert validate["nulled_cells"] == {validate["outputs"][0]: 3}, validate.get("nulled_cells")
+    verify = core.run_verify(clean["outputs"], _folder(tmp, "verify"), log=_noop, summary_format="json")
+    assert not verify["errors"], verify["errors"]
+    assert [t["rows"] for t in verify["totals"]] == [3, 0], verify["totals"]
+
+
+def check_verify_engines(tmp):
+    """The pandas and pure-Python Verify engines give the same totals, whatever the pandas chunk
+    size, and those totals are the exactly rounded sums of the cells that `float()` accepts."""
+    if not core.have_pandas():
+        raise Skip("needs pandas")
+    rng = random.Random(5)
+    odd = ["", " ", "True", "1_000", "n/a", " 7 ", "1e3"]
+    lines, cells = [], [[], [], []]
+    for n in range(30_000):
+        row = [f"r{n}", "x", "y"]
+        for k in range(1 + n % 3 if n % 1009 == 0 else 3):   # now and then a short row
+            value = rng.choice(odd) if n % 997 == 0 else f"{rng.uniform(0, 5000):.{rng.choice([2, 3, 6])}f}"
+            row.append(value)
+            cells[k].append(value)
+        lines.append(",".join(row))
+    src = _write(os.path.join(tmp, "sums.csv"), "\r\n".join(lines).encode())
+    numbers = [[core._to_float(v) for v in col] for col in cells]
+    expected = [math.fsum(x for x in col if x is not None) for col in numbers]
+    want = core._sum_4_5_6_python(src).result()
+    assert want[1:4] == tuple(round(x, 2) for x in expected), f"{want} != exact {expected}"
+    for chunk_rows in (core.SUM_CHUNK_ROWS, 1234):
+        saved, core.SUM_CHUNK_ROWS = core.SUM_CHUNK_ROWS, chunk_rows
+        try:
+            got = core._sum_4_5_6_pandas(src).result()
+        finally:
+            core.SUM_CHUNK_ROWS = saved
+        assert got == want, f"pandas ({chunk_rows} rows a chunk) {got} != python {want}"
+
+
+def check_shard_records(tmp):
+    """The byte-range shards of a file, each finding its own edges, hold the same records and
+    lines as the whole file, read as a plain CSV and as a ZIP member stored uncompressed."""
+    rng = random.Random(24)
+    data = _quoted_csv(rng, 3000)
+    src = _write(os.path.join(tmp, "quoted.csv"), data)
+    archive = os.path.join(tmp, "quoted.zip")
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as z:
+        z.writestr("prefix.csv", data[:777])
+        z.writestr("quoted.csv", data)
+    whole = list(csv.reader(io.StringIO(data.decode(), newline="")))
+    for path in (src, core.member_key(archive, "quoted.csv")):
+        file, first, last = core.raw_extent(path)
+        for shards in (2, 3, 5, 8, 13):
+            with _Sharded():
+                spans = core.plan_shards(path, shards)
+            for quoted in (True, False):
+                edges = [core.record_span(path, span, quoted) for span in spans]
+                assert edges[0][0] == first and edges[-1][1] == last, f"{path} {shards}: {edges}"
+                assert all(a[1] == b[0] for a, b in zip(edges, edges[1:])), f"{path} {shards}: {edges}"
+                if not quoted:
+                    assert all(e == last or data[e - first - 1:e - first] == b"\n" for _, e in edges)
+                    continue
+                rows = []
+                for start, end in edges:
+                    with core.open_range(file, start, end) as f:
+                        rows.extend(csv.reader(io.TextIOWrapper(f, encoding="utf-8", newline="")))
+                assert rows == whole, f"{path} in {shards} shards: {len(rows)} records, {len(whole)} whole"
+
+
+def check_shard_long_fields(tmp):
+    """Shard edges inside a quoted field or a line longer than SHARD_SYNC_BYTES read on to the
+    record or line end: the shard is merged into the one before, none overlap and no record
+    is lost."""
+    rng = random.Random(224)
+    sync = 64
+    head, body = _quoted_csv(rng, 40).split(b"\r\n", 1)
+    body, trailer = body.rsplit(b"\r\n", 1)
+    data = b"\r\n".join([head, b'a,"' + b"x" * (5 * sync) + b'",b,1,2,3',       # no quote or line break inside
+                          body, b'"' + b'one ""q""\r\n' * 40 + b'",b,c,4,5,6',  # line breaks and escaped quotes
+                          trailer])
+    src = _write(os.path.join(tmp, "long.csv"), data)
+    whole = list(csv.reader(io.StringIO(data.decode(), newline="")))
+    saved, core.SHARD_SYNC_BYTES = core.SHARD_SYNC_BYTES, sync
+    try:
+        merged = False
+        for shards in (2, 5, 13, 40, 97):
+            with _Sharded():
+                spans = core.plan_shards(src, shards)
+            for quoted in (True, False):
+                edges = [core.record_span(src, span, quoted) for span in spans]
+                assert edges[0][0] == 0 and edges[-1][1] == len(data), f"{shards}: {edges}"
+                assert all(a[1] == b[0] for a, b in zip(edges, edges[1:])), f"{shards}: {edges}"
+                assert all(start <= end for start, end in edges), f"{shards}: {edges}"
+                if not quoted:
+                    assert all(e == len(data) or data[e - 1:e] == b"\n" for _, e in edges)
+                    continue
+                merged = merged or any(start == end for start, end in edges)
+                rows = []
+                for start, end in edges:
+                    rows.extend(csv.reader(io.StringIO(data[start:end].decode(), newline="")))
+                assert rows == whole, f"{shards} shards: {len(rows)} records, {len(whole)} whole"
+        assert merged, "no shard edge fell inside a long field"
+    finally:
+        core.SHARD_SYNC_BYTES = saved
+
+
+def check_shard_runs(tmp):
+    """Verify, Clean and Validate give the same totals and output files with and without
+    splitting the input into shards."""
+    rng = random.Random(124)
+    data = _quoted_csv(rng, 4000)
+    src = _write(os.path.join(tmp, "Sales_East.csv"), data)
+    archive = os.path.join(tmp, "drop.zip")
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as z:
+        z.writestr("Sales_East.csv", data)
+    results = {}
+    for workers in (1, 4):
+        out = _folder(tmp, f"w{workers}")
+        with _Sharded():
+            verify = core.run_verify([src, archive], out, log=_noop, summary_format="json", workers=workers)
+            clean = core.run_clean([archive], out, workers=workers, log=_noop)
+            validate = core.run_validate([src], None, out, log=_noop, workers=workers,
+                                         mapping=({core.normalize_file_name("Sales_East.csv"): 42}, {}))
+        for summary in (verify, clean, validate):
+            assert not summary["errors"], summary["errors"]
+        files = {}
+        for path in clean["outputs"] + validate["outputs"]:
+            with open(path, "rb") as f:
+                files[os.path.basename(path)] = f.read()
+        results[workers] = ([{k: v for k, v in t.items() if k != "file"} for t in verify["totals"]], files)
+    assert results[1][0] == results[4][0], f"verify totals {results[1][0]} != sharded {results[4][0]}"
+    assert results[1][1] == results[4][1], "sharded clean or validate output differs from the whole-file run"
+
+
+def check_mapped_validate(tmp):
+    """The memory-mapped bytes engine of Validate writes the same lines as `validated_lines`
+    over the decoded text, block edges included, on quoted line breaks, CRLF, LF and CR line
+    ends, a BOM, non-ASCII text, other Unicode line breaks, bad UTF-8 and an empty file; and
+    a run cancelled after its first block resumes from its checkpoint to the same file."""
+    rng = random.Random(25)
+    inputs = {
+        "empty": b"",
+        "crlf": _quoted_csv(rng, 400),
+        "lf": _quoted_csv(rng, 400, "\n") + b"\n",
+        "cr": _quoted_csv(rng, 400, "\r"),
+        "bom": b"\xef\xbb\xbf" + _quoted_csv(rng, 400),
+        "breaks": b"\r\n".join(b"a,b,c %d x,1,2,3,4%s" % (n, b"\x0bv,w,x y,4,5,6,7" if n % 7 == 0 else
+                                                          b"\x1cv,w,x y,4,5,6,7" if n % 11 == 0 else b"")
+                                for n in range(400)),
+        "text": "\r\n".join(f"a,b,Säle {n} x,1,2,3,4" for n in range(400)).encode() + b"\r\n\r\n,,,\xff,\xc3,1,2",
+    }
+    saved = core.MAP_BLOCK_BYTES
+    try:
+        for name, data in inputs.items():
+            src = _write(os.path.join(tmp, f"{name}.csv"), data)
+            lines = core.validated_lines(data.decode("utf-8", errors="ignore").splitlines(), 7)
+            want = os.linesep.join(lines).encode("utf-8")
+            for block in (saved, 1000, 64):
+                core.MAP_BLOCK_BYTES = block
+                mapped = core.process_single_csv(src, 7, _folder(tmp, f"{name}-mapped-{block}"))
+                with open(mapped, "rb") as f:
+                    assert f.read() == want, f"{name}: mapped output ({block}-byte blocks) differs from validated_lines"
+            cancel = threading.Event()
+            out = _folder(tmp, f"{name}-resumed")
+            try:
+                core.process_single_csv(src, 7, out, on_progress=lambda *_: cancel.set(), cancel=cancel,
+                                        checkpoints=True)
+            except core.CancelledRun:
+                pass
+            with open(core.process_single_csv(src, 7, out, checkpoints=True), "rb") as f:
+                assert f.read() == want, f"{name}: resumed output (64-byte blocks) differs from validated_lines"
+    finally:
+        core.MAP_BLOCK_BYTES = saved
+
+
+CHECKS = {
+    "parquet-validate": check_parquet_validate,
+    "parquet-outputs": check_parquet_outputs,
+    "clean-members": check_clean_members,
+    "verify-engines": check_verify_engines,
+    "shard-records": check_shard_records,
+    "shard-long-fields": check_shard_long_fields,
+    "shard-runs": check_shard_runs,
+    "mapped-validate": check_mapped_validate,
+}
+
+
+def run(names):
+    failed = 0
+    for name in names:
+        with tempfile.TemporaryDirectory(prefix="iqvia_check_") as tmp:
+            try:
+                CHECKS[name](tmp)
+                print(f"{name}: ok")
+            except Skip as e:
+                print(f"{name}: skipped ({e})")
+            except Exception:
+                failed += 1
+                print(f"{name}: FAIL")
+                traceback.print_exc()
+    return failed
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="iqvia_selftest.py", description=__doc__.splitlines()[0])
+    parser.add_argument("--only", action="append", choices=list(CHECKS), help="run just this check (repeatable)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return 1 if run(args.only or list(CHECKS)) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
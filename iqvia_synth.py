@@ -0,0 +1,229 @@
+"""Synthetic IQVIA-shaped test data for the IQVIA Data tool and its benchmarks.
+
+    python iqvia_synth.py bench-data/ --size 200MB
+    python iqvia_synth.py bench-data/ --size 20GB --zips 4 --members 5 --seed 7
+
+Writes, under the output folder:
+
+    zips/drop_N.zip    ZIPs of CSVs for Clean Data: a header and a trailer row, rows whose
+                       columns 2 and 3 match (dropped by cleaning), quoted fields that contain
+                       the delimiter, and a different delimiter per CSV (, ; | tab)
+    csv/*.csv          comma-separated CSVs for Verify Sums and Validate CSV
+    mapping.xlsx       'File Name' / 'Add in File' workbook matching csv/ (needs pandas + openpyxl)
+    sku/new.csv        Master SKU's inputs: the new file first, then the master files
+    sku/master_N.csv
+    dataset.json       what was written (paths relative to the folder, rows, bytes), read by
+                       iqvia_bench.py
+
+--size is the uncompressed size of each of the three sets (ZIP contents, csv/, sku/).
+The same --seed always produces the same files.
+"""
+import os
+import io
+import re
+import csv
+import sys
+import json
+import random
+import zipfile
+import argparse
+
+CORPORATES = ["GSK", "PFIZER", "SANOFI", "NOVARTIS", "ABBOTT", "BAYER", "ROCHE", "MERCK", "TAKEDA", "VIATRIS",
+              "SUN PHARMA", "CIPLA", "TEVA", "ASTRAZENECA", "LILLY", "BOEHRINGER"]
+MOLECULES = ["PARACETAMOL", "IBUPROFEN", "AMOXICILLIN", "METFORMIN", "OMEPRAZOLE", "ATORVASTATIN", "CETIRIZINE",
+             "AMLODIPINE", "LOSARTAN", "SALBUTAMOL", "DICLOFENAC", "AZITHROMYCIN", "LEVOTHYROXINE", "INSULIN"]
+FORMS = ["TAB", "CAP", "SYR", "INJ", "CRM", "DROPS", "SACHET"]
+CHANNELS = ["RETAIL", "HOSPITAL", "ONLINE"]
+DELIMITERS = [",", ";", "|", "\t"]
+REGIONS = ["North", "South", "East", "West", "Central", "Coastal", "Metro", "Rural"]
+
+CHUNK_ROWS = 10_000           # rows formatted per write
+DUPLICATE_SHARE = 0.05        # rows whose columns 2 and 3 are equal
+QUOTED_SHARE = 0.02           # rows whose product text contains the delimiter
+SKU_MASTERS = 3
+
+
+def parse_size(text):
+    """'500KB', '200MB', '20GB' or a plain byte count -> bytes."""
+    m = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)B?\s*", text.upper())
+    if not m:
+        raise argparse.ArgumentTypeError(f"not a size: {text!r} (try 200MB or 20GB)")
+    return int(float(m.group(1)) * 1024 ** " KMGT".index(m.group(2) or " "))
+
+
+class SalesRows:
+    """Random rows shaped like an IQVIA sales extract; the same seed gives the same rows."""
+
+    def __init__(self, rng, n_products=5000):
+        self.rng = rng
+        self.products = []
+        for i in range(n_products):
+            molecule = rng.choice(MOLECULES)
+            brand = f"{molecule[:4]}{rng.choice(['EX', 'ON', 'AX', 'OL', 'IN'])}{i % 97}"
+            self.products.append((rng.choice(CORPORATES), brand,
+                                  f"{brand} {rng.choice([5, 10, 25, 50, 100, 250, 500])}MG "
+                                  f"{rng.choice(FORMS)} {rng.choice([10, 14, 20, 28, 30, 60])}",
+                                  f"{rng.randrange(10 ** 7):07d}"))
+
+    def rows(self, n, delimiter=","):
+        rng = self.rng
+        out = []
+        for _ in range(n):
+            corporate, brand, product, sku = rng.choice(self.products)
+            r = rng.random()
+            if r < DUPLICATE_SHARE:
+                product = brand.lower()
+            elif r < DUPLICATE_SHARE + QUOTED_SHARE:
+                product = f"{product}{delimiter} PROMO PACK"
+            units = rng.randrange(1, 5000)
+            out.append([corporate, brand, product, units, round(units * rng.uniform(0.5, 40.0), 2),
+                        round(units * rng.uniform(0.01, 2.0), 3), f"2025{rng.randrange(1, 13):02d}",
+                        rng.choice(CHANNELS), sku])
+        return out
+
+
+SALES_HEADER = ["Corporation", "Brand", "Product", "Units", "Value", "Volume", "Period", "Channel", "SKU"]
+
+
+def write_rows(binary, rows_source, target_bytes, delimiter=",", header=SALES_HEADER, trailer=True):
+    """Write a header, rows until about `target_bytes` and (optionally) a totals trailer to
+    a binary stream. Returns (data rows, bytes written)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=delimiter, lineterminator="\r\n")
+    writer.writerow(header)
+    written = rows = 0
+    units = value = 0.0
+    while written < target_bytes or rows == 0:
+        chunk = rows_source(CHUNK_ROWS, delimiter)
+        writer.writerows(chunk)
+        rows += len(chunk)
+        if trailer:
+            units += sum(r[3] for r in chunk)
+            value += sum(r[4] for r in chunk)
+        data = buf.getvalue().encode("utf-8")
+        binary.write(data)
+        written += len(data)
+        buf.seek(0)
+        buf.truncate()
+    if trailer:
+        writer.writerow(["TOTAL", "", "", int(units), round(value, 2), "", "", "", ""])
+        data = buf.getvalue().encode("utf-8")
+        binary.write(data)
+        written += len(data)
+    return rows, written
+
+
+def make_zips(folder, size, n_zips, n_members, gen, log):
+    os.makedirs(folder, exist_ok=True)
+    files = []
+    per_member = max(1, size // (n_zips * n_members))
+    for z in range(1, n_zips + 1):
+        path = os.path.join(folder, f"drop_{z}.zip")
+        members = []
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+            for m in range(1, n_members + 1):
+                name = f"extract_{z}_{m}.csv"
+                delimiter = DELIMITERS[(z + m) % len(DELIMITERS)]
+                with zf.open(name, "w", force_zip64=True) as dst:
+                    rows, nbytes = write_rows(dst, gen.rows, per_member, delimiter)
+                members.append({"name": name, "delimiter": delimiter, "rows": rows, "bytes": nbytes})
+        files.append({"path": path, "members": members, "rows": sum(m["rows"] for m in members),
+                      "bytes": sum(m["bytes"] for m in members)})
+        log(f"{path}: {files[-1]['rows']:,} rows, {files[-1]['bytes'] / 1e6:,.1f} MB uncompressed")
+    return files
+
+
+def make_csvs(folder, size, n_files, gen, log):
+    """Comma-separated CSVs named like the mapping entries (Sales_<Region>.csv)."""
+    os.makedirs(folder, exist_ok=True)
+    files = []
+    for i in range(n_files):
+        region = REGIONS[i % len(REGIONS)] + (str(i // len(REGIONS)) if i >= len(REGIONS) else "")
+        path = os.path.join(folder, f"Sales_{region}.csv")
+        with open(path, "wb") as f:
+            rows, nbytes = write_rows(f, gen.rows, max(1, size // n_files), trailer=False)
+        files.append({"path": path, "rows": rows, "bytes": nbytes, "value": 100 + i})
+        log(f"{path}: {rows:,} rows, {nbytes / 1e6:,.1f} MB")
+    return files
+
+
+def make_mapping(path, csv_files, log):
+    """Mapping rows for every CSV (spelled the way the users type them) plus unrelated names."""
+    try:
+        import pandas as pd
+    except ImportError:
+        log("pandas is not installed: mapping.xlsx was not written (Validate cannot be benchmarked)")
+        return None
+    names = [os.path.basename(f["path"]).replace("Sales_", "sale_ ").lower() for f in csv_files]
+    values = [f["value"] for f in csv_files]
+    names += [f"sale_other{i}.csv" for i in range(200)]
+    values += list(range(1000, 1200))
+    pd.DataFrame({"File Name": names, "Add in File": values}).to_excel(path, index=False, engine="openpyxl")
+    log(f"{path}: {len(names)} mapping rows")
+    return path
+
+
+def make_skus(folder, size, gen, rng, log):
+    """sku/new.csv plus master files (Corporation, Brand, Product, SKU); about 10% of the
+    new file's products are missing from every master."""
+    os.makedirs(folder, exist_ok=True)
+    known = [p for p in gen.products if rng.random() < 0.9]
+
+    def rows_of(products):
+        return lambda n, delimiter: [rng.choice(products) for _ in range(n)]
+
+    n_files = SKU_MASTERS + 1
+    files = []
+    for i in range(n_files):
+        name = "new.csv" if i == 0 else f"master_{i}.csv"
+        path = os.path.join(folder, name)
+        with open(path, "wb") as f:
+            rows, nbytes = write_rows(f, rows_of(gen.products if i == 0 else known), max(1, size // n_files),
+                                      header=["Corporation", "Brand", "Product", "SKU"], trailer=False)
+        files.append({"path": path, "rows": rows, "bytes": nbytes})
+        log(f"{path}: {rows:,} rows, {nbytes / 1e6:,.1f} MB")
+    return files
+
+
+def generate(out_dir, size, n_zips=2, n_members=3, n_csvs=4, seed=1, log=print):
+    """Write the whole dataset under `out_dir` and return its description (also saved as dataset.json)."""
+    rng = random.Random(seed)
+    gen = SalesRows(rng)
+    os.makedirs(out_dir, exist_ok=True)
+    dataset = {"seed": seed, "size": size}
+    dataset["zips"] = make_zips(os.path.join(out_dir, "zips"), size, n_zips, n_members, gen, log)
+    dataset["csvs"] = make_csvs(os.path.join(out_dir, "csv"), size, n_csvs, gen, log)
+    dataset["mapping"] = make_mapping(os.path.join(out_dir, "mapping.xlsx"), dataset["csvs"], log)
+    dataset["skus"] = make_skus(os.path.join(out_dir, "sku"), size, gen, rng, log)
+    relative = json.loads(json.dumps(dataset))
+    for group in ("zips", "csvs", "skus"):
+        for entry in relative[group]:
+            entry["path"] = os.path.relpath(entry["path"], out_dir)
+    if relative["mapping"]:
+        relative["mapping"] = os.path.relpath(relative["mapping"], out_dir)
+    with open(os.path.join(out_dir, "dataset.json"), "w", encoding="utf-8") as f:
+        json.dump(relative, f, indent=2)
+    return dataset
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="iqvia_synth.py", description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="folder to write the dataset into")
+    parser.add_argument("--size", type=parse_size, default=parse_size("50MB"),
+                        help="uncompressed size of each set, e.g. 500KB, 200MB, 20GB (default: 50MB)")
+    parser.add_argument("--zips", type=int, default=2, help="number of ZIP files (default: 2)")
+    parser.add_argument("--members", type=int, default=3, help="CSVs per ZIP (default: 3)")
+    parser.add_argument("--csvs", type=int, default=4, help="CSVs for Verify/Validate (default: 4)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed (default: 1)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    generate(args.output, args.size, args.zips, args.members, args.csvs, args.seed,
+             log=lambda msg: print(msg, file=sys.stderr, flush=True))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())